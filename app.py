@@ -1,9 +1,20 @@
 import streamlit as st
-import streamlit.components.v1 as components
 from datetime import date, datetime
 import os
+from uuid import uuid4
 from dotenv import load_dotenv
-from supabase import create_client
+from supabase_pool import SupabasePool
+from auth_session import AuthSessionError, AuthUnavailableError, SessionManager
+from breaker import is_backend_failure
+from repos import Db, QueryStats
+from cache import AppCaches
+from uploads import PhotoUploader
+from prefetch import CasePrefetcher
+from outbox import ACKNOWLEDGE, INSERT_CASE, Outbox
+from guidance import GUIDANCE_CONCURRENCY, GUIDANCE_FAILED, GuidanceWorker, load_backend
+from redflags import RedFlagDetector
+from assets import build_font_assets, build_stylesheet
+from nav import app_nav, live_changes
 
 load_dotenv()
 
@@ -18,505 +29,95 @@ if not SUPABASE_URL or not SUPABASE_KEY:
     st.stop()
 
 
-def get_supabase_client():
-    return create_client(SUPABASE_URL, SUPABASE_KEY)
+@st.cache_resource
+def get_supabase_pool():
+    # One pooled transport per process, shared by every session and rerun
+    return SupabasePool(SUPABASE_URL, SUPABASE_KEY)
 
 
-sb = get_supabase_client()
+def get_supabase_client():
+    if "sb" not in st.session_state:
+        st.session_state.sb = get_supabase_pool().session_client()
+    return st.session_state.sb
 
-# Restore auth session if we have tokens stored
-if st.session_state.get("access_token") and st.session_state.get("refresh_token"):
-    try:
-        sb.auth.set_session(
-            st.session_state["access_token"],
-            st.session_state["refresh_token"],
-        )
-    except Exception:
-        pass
 
-# ── Global CSS ──────────────────────────────────────────────────────────
-st.markdown("""
-<meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=5.0, user-scalable=yes">
-<style>
-    /* ── Montserrat font ── */
-    @import url('https://fonts.googleapis.com/css2?family=Montserrat:wght@400;500;600;700;800&display=swap');
-
-    .stApp, .stMarkdown, .stMarkdown p, .stMarkdown h1, .stMarkdown h2,
-    .stMarkdown h3, .stMarkdown h4, .stMarkdown h5, .stMarkdown h6,
-    .stButton > button, .stTextInput input, .stTextArea textarea,
-    .stSelectbox, .stDateInput input, .stCheckbox label,
-    .stFileUploader, .stAlert, .block-container,
-    .stPopover > button {
-        font-family: 'Montserrat', sans-serif !important;
-    }
+def get_session_manager():
+    if "auth" not in st.session_state:
+        st.session_state.auth = SessionManager(get_supabase_client())
+    return st.session_state.auth
 
-    /* Hide Streamlit chrome */
-    #MainMenu, header, footer {visibility: hidden;}
 
-    /* Force Streamlit main container to fill the viewport on mobile */
-    .stApp > header + div,
-    .stApp [data-testid="stAppViewContainer"],
-    .stApp [data-testid="stMain"],
-    section[data-testid="stSidebar"] + section,
-    .main .block-container {
-        width: 100% !important;
-    }
-    .block-container {
-        max-width: 960px !important;
-        padding: 1rem 1.5rem !important;
-        margin: 0 auto !important;
-    }
+@st.cache_resource
+def get_query_stats():
+    return QueryStats()
 
-    /* ── Responsive breakpoints ── */
-    @media (max-width: 480px) {
-        .block-container {
-            max-width: 100% !important;
-            padding: 0.75rem 1rem !important;
-        }
-        /* Override Streamlit's inner padding that shrinks content on mobile */
-        .stApp [data-testid="stAppViewContainer"] {
-            padding-left: 0 !important;
-            padding-right: 0 !important;
-        }
-        .stApp [data-testid="stMain"] {
-            padding: 0 !important;
-        }
-    }
-    @media (min-width: 481px) and (max-width: 768px) {
-        .block-container {
-            max-width: 600px !important;
-            padding: 1rem 2rem !important;
-        }
-    }
-    @media (min-width: 769px) {
-        .block-container {
-            max-width: 960px !important;
-            padding: 1.5rem 3rem !important;
-        }
-    }
 
-    /* Brand colours */
-    :root {
-        --brand: #2B6777;
-        --brand-light: #52AB98;
-        --bg: #F5F5F5;
-        --card-bg: #FFFFFF;
-        --text-dark: #1E1E1E;
-        --text-muted: #888888;
-        --red: #D32F2F;
-    }
+@st.cache_resource
+def get_app_caches():
+    return AppCaches()
 
-    /* ── Primary buttons (teal filled) ── */
-    .stButton > button[kind="primary"] {
-        background-color: var(--brand) !important;
-        color: white !important;
-        border: none !important;
-        border-radius: 25px !important;
-        padding: 0.5rem 1.2rem !important;
-        font-weight: 600 !important;
-        font-size: clamp(0.85rem, 2vw, 1rem) !important;
-        width: 100%;
-        transition: background-color 0.2s;
-    }
-    .stButton > button[kind="primary"]:hover {
-        background-color: var(--brand-light) !important;
-    }
 
-    /* Primary button responsive sizing */
-    @media (min-width: 480px) {
-        .stButton > button[kind="primary"] {
-            padding: 0.6rem 1.5rem !important;
-        }
-    }
-    @media (min-width: 769px) {
-        .stButton > button[kind="primary"] {
-            padding: 0.7rem 2rem !important;
-            font-size: 1rem !important;
-        }
-    }
+@st.cache_resource
+def get_outbox():
+    return Outbox()
 
-    /* ── Secondary buttons (case entries – View button) ── */
-    .stButton > button[kind="secondary"] {
-        background: transparent !important;
-        color: var(--brand) !important;
-        border: 1.5px solid #ddd !important;
-        border-radius: 20px !important;
-        box-shadow: none !important;
-        padding: 5px 14px !important;
-        text-align: center !important;
-        font-weight: 600 !important;
-        font-size: 0.75rem !important;
-        width: auto !important;
-    }
-    .stButton > button[kind="secondary"]:hover {
-        background: var(--brand) !important;
-        color: white !important;
-        border-color: var(--brand) !important;
-    }
 
-    /* Social / outline buttons */
-    .social-btn {
-        display: inline-flex; align-items: center; justify-content: center; gap: 8px;
-        border: 1.5px solid #ddd; border-radius: 25px;
-        padding: 10px 0; width: 48%; max-width: 200px; text-align: center;
-        font-size: 0.9rem; font-weight: 500; color: var(--text-dark);
-        background: white; cursor: pointer;
-    }
-    .social-btn:hover {background: #f9f9f9;}
-    .social-row {display: flex; gap: 4%; justify-content: center; margin: 0.5rem 0; flex-wrap: wrap;}
+@st.cache_resource
+def get_photo_uploader():
+    # Photo patches queue behind their case insert in the outbox
+    return PhotoUploader(attach=get_outbox().enqueue_photo)
 
-    /* Divider */
-    .or-divider {
-        display: flex; align-items: center; gap: 12px;
-        color: var(--text-muted); margin: 1rem 0; font-size: 0.85rem;
-    }
-    .or-divider::before, .or-divider::after {
-        content: ""; flex: 1; height: 1px; background: #ddd;
-    }
 
-    /* App header bar */
-    .app-header {
-        display: flex;
-        align-items: center;
-        justify-content: flex-end;
-        gap: 12px;
-        padding: 0.3rem 0;
-    }
-    .header-bell {
-        display: flex; align-items: center; justify-content: center;
-    }
-    .header-bell svg {width: 24px; height: 24px;}
-    .header-avatar {
-        width: 42px; height: 42px; border-radius: 50%; background: #52AB98;
-        display: flex; align-items: center; justify-content: center;
-        color: white; font-weight: 700; font-size: 1rem;
-        font-family: 'Montserrat', sans-serif;
-        flex-shrink: 0;
-    }
+@st.cache_resource
+def get_case_prefetcher():
+    return CasePrefetcher()
 
 
-    /* ── File uploader – smaller drag-and-drop text ── */
-    .stFileUploader section {
-        padding: 0.5rem !important;
-    }
-    .stFileUploader section > div {
-        font-size: 0.7rem !important;
-    }
-    .stFileUploader small {
-        font-size: 0.65rem !important;
-    }
-    .stFileUploader section button {
-        font-size: 0.72rem !important;
-        padding: 0.2rem 0.8rem !important;
-    }
+@st.cache_resource
+def get_red_flag_detector():
+    return RedFlagDetector.from_config()
 
-    /* Links */
-    .link-text {color: var(--brand); font-weight: 600; text-decoration: none;}
-    .muted {color: var(--text-muted); font-size: 0.82rem; text-align: center;}
-
-    /* Inputs */
-    .stTextInput > div > div > input,
-    .stTextArea > div > div > textarea,
-    .stSelectbox > div > div,
-    .stDateInput > div > div > input {
-        border-radius: 12px !important;
-        width: 100% !important;
-        box-sizing: border-box !important;
-        font-size: 16px !important;  /* Prevents iOS zoom on focus */
-    }
 
-    /* Symptom bubble */
-    .symptom-bubble {
-        background: var(--brand);
-        color: white;
-        border-radius: 16px;
-        padding: 0.7rem 1rem;
-        font-size: 0.88rem;
-        line-height: 1.4;
-        margin: 0.5rem 0 1rem 0;
-        display: inline-block;
-    }
+@st.cache_resource
+def get_guidance_worker():
+    # Needs the service key: the worker guides every centre's cases
+    service_key = os.getenv("SUPABASE_SERVICE_KEY")
+    if not GUIDANCE_CONCURRENCY or not service_key:
+        return None
+    client = get_supabase_pool().session_client()
+    client.bind(service_key)
+    return GuidanceWorker(Db(client, get_query_stats(), get_app_caches()), load_backend()).start()
 
-    /* AI Guidance card (light - carer view) */
-    .ai-card {
-        background: #F0F4F5;
-        border-radius: 14px;
-        padding: 1rem 1.2rem;
-        margin: 1rem 0;
-    }
-    /* AI Guidance card (dark - parent view) */
-    .ai-card-dark {
-        background: var(--brand);
-        color: white;
-        border-radius: 14px;
-        padding: 1rem 1.2rem;
-        margin: 1rem 0;
-    }
-    .ai-card-dark a {color: #FFD6D6; font-weight: 600;}
-    .ai-card h4, .ai-card-dark h4 {
-        margin: 0 0 0.5rem 0;
-        font-size: 1rem;
-        font-weight: 700;
-    }
-    .ai-card-dark h4 {color: white;}
-    .ai-label {font-weight: 700; font-size: 0.88rem;}
-    .ai-text {font-size: 0.85rem; color: #444; line-height: 1.5; margin-top: 0.5rem;}
-    .ai-card-dark .ai-text {color: #E0E0E0;}
-
-    /* Category tag */
-    .cat-tag {
-        display: inline-block;
-        background: var(--brand);
-        color: white;
-        border-radius: 20px;
-        padding: 3px 14px;
-        font-size: 0.78rem;
-        font-weight: 600;
-    }
 
-    /* ── Case row (pure HTML – never stacks) ── */
-    .case-row {
-        display: flex;
-        align-items: center;
-        gap: 12px;
-        padding: 10px 0;
-        border-bottom: 1px solid #f0f0f0;
-        cursor: pointer;
-    }
-    .case-row:hover { background: #fafafa; }
-    .case-row:last-of-type { border-bottom: none; }
-    .case-row-img, .case-row-img-placeholder {
-        width: 64px;
-        height: 64px;
-        min-width: 64px;
-        object-fit: cover;
-        border-radius: 12px;
-    }
-    .case-row-img-placeholder {
-        background: #e8e8e8;
-    }
-    .case-row-info {
-        flex: 1;
-        min-width: 0;
-    }
-    .case-row-date {
-        font-size: 0.72rem;
-        color: var(--brand);
-        font-weight: 500;
-    }
-    .case-row-name {
-        font-size: 0.92rem;
-        font-weight: 700;
-        color: var(--text-dark);
-        white-space: nowrap;
-        overflow: hidden;
-        text-overflow: ellipsis;
-    }
-    .case-row-symptom {
-        font-size: 0.82rem;
-        color: #555;
-        white-space: nowrap;
-        overflow: hidden;
-        text-overflow: ellipsis;
-    }
-    .case-row-view {
-        margin-left: auto;
-        flex-shrink: 0;
-        font-size: 0.75rem;
-        font-weight: 600;
-        color: var(--brand);
-        border: 1.5px solid #ddd;
-        border-radius: 20px;
-        padding: 5px 14px;
-        white-space: nowrap;
-        cursor: pointer;
-    }
-    .case-row-view:hover {
-        background: var(--brand);
-        color: white;
-        border-color: var(--brand);
-    }
-    @media (min-width: 769px) {
-        .case-row-img, .case-row-img-placeholder {
-            width: 80px; height: 80px; min-width: 80px;
-        }
-        .case-row-name { font-size: 1rem; }
-        .case-row-symptom { font-size: 0.9rem; }
-        .case-row-view { font-size: 0.82rem; padding: 6px 18px; }
-    }
+def get_db():
+    if "db" not in st.session_state:
+        st.session_state.db = Db(get_supabase_client(), get_query_stats(), get_app_caches())
+    return st.session_state.db
 
-    /* ── Responsive typography ── */
-    @media (min-width: 769px) {
-        .symptom-bubble {
-            font-size: 1rem;
-            padding: 1rem 1.4rem;
-        }
-        .ai-card, .ai-card-dark {
-            padding: 1.5rem 2rem;
-        }
-        .ai-text {
-            font-size: 0.95rem;
-        }
-        .red-flags-card, .update-card, .symptom-section-card {
-            padding: 1.5rem 2rem;
-        }
-        .social-btn {
-            padding: 12px 0;
-            font-size: 1rem;
-        }
-    }
 
-    /* ── Responsive centering for form elements ── */
-    @media (min-width: 480px) {
-        .stButton > button[kind="primary"] {
-            max-width: 320px !important;
-        }
-    }
-    @media (min-width: 769px) {
-        .stButton > button[kind="primary"] {
-            max-width: 400px !important;
-        }
-        .stTextInput, .stTextArea, .stSelectbox, .stDateInput, .stFileUploader {
-            max-width: 500px !important;
-            margin-left: auto !important;
-            margin-right: auto !important;
-        }
-        .stCheckbox {
-            max-width: 500px !important;
-            margin-left: auto !important;
-            margin-right: auto !important;
-        }
-        .stMarkdown {
-            max-width: 500px;
-            margin-left: auto;
-            margin-right: auto;
-        }
-    }
+auth = get_session_manager()
+db = get_db()
+db.begin_rerun()
 
-    /* Red flags */
-    .red-flags-card {
-        background: var(--card-bg);
-        border-radius: 14px;
-        padding: 1rem 1.2rem;
-        margin: 1rem 0;
-        box-shadow: 0 2px 8px rgba(0,0,0,0.06);
-    }
-    .red-flag-title {
-        color: var(--red);
-        font-weight: 700;
-        font-size: 0.95rem;
-        margin-bottom: 0.5rem;
-    }
-    .red-flag-item {
-        display: flex; align-items: center; gap: 8px;
-        font-size: 0.88rem; color: #333;
-        padding: 4px 0; font-weight: 600;
-    }
-    .red-dot {
-        width: 22px; height: 22px; border-radius: 50%;
-        background: var(--red); color: white;
-        display: inline-flex; align-items: center; justify-content: center;
-        font-size: 0.7rem; font-weight: 700; flex-shrink: 0;
-    }
-
-    /* Submitted meta */
-    .submitted-meta {
-        font-size: 0.78rem;
-        color: var(--text-muted);
-        margin: -0.3rem 0 1rem 0;
-    }
-
-    /* Parent update card */
-    .update-card {
-        background: var(--card-bg);
-        border-radius: 14px;
-        padding: 1.2rem;
-        box-shadow: 0 2px 8px rgba(0,0,0,0.06);
-        margin: 1rem 0;
-    }
-    .update-card h4 {margin: 0 0 4px 0; font-size: 1.05rem;}
-    .update-card .update-time {
-        font-size: 0.78rem; color: var(--text-muted);
-        border-bottom: 1px solid #eee; padding-bottom: 8px; margin-bottom: 8px;
-    }
-    .update-desc {
-        font-size: 0.88rem;
-        color: #555;
-        line-height: 1.5;
-        margin: 0.5rem 0 0 0;
-    }
-
-    /* Symptom section card */
-    .symptom-section-card {
-        background: var(--card-bg);
-        border-radius: 14px;
-        padding: 1.2rem;
-        box-shadow: 0 2px 8px rgba(0,0,0,0.06);
-        margin: 0.5rem 0 1rem 0;
-    }
-
-    /* Carer home title */
-    .carer-home-title {
-        font-size: clamp(1.3rem, 3vw, 2rem);
-        font-weight: 800;
-        color: var(--text-dark);
-        margin-bottom: 1rem;
-        text-align: left;
-    }
-
-    /* Disclaimer text */
-    .disclaimer {
-        color: var(--text-muted);
-        font-size: clamp(0.7rem, 1.5vw, 0.85rem);
-        text-align: center;
-        margin-top: 2rem;
-        line-height: 1.4;
-    }
+# ── Global CSS ──────────────────────────────────────────────────────────
+@st.cache_resource
+def get_font_assets():
+    return build_font_assets()
 
-    /* ── Recent-cases bordered container ── */
-    div[data-testid="stVerticalBlockBorderWrapper"] {
-        border-radius: 18px !important;
-        box-shadow: 0 2px 12px rgba(0,0,0,0.07) !important;
-        border: none !important;
-    }
 
-    /* ── Hide back-nav trigger buttons (preceded by .hide-next-btn marker) ── */
-    *:has(.hide-next-btn) + * .stButton {
-        height: 0 !important;
-        max-height: 0 !important;
-        overflow: hidden !important;
-        margin: 0 !important;
-    }
+@st.cache_resource
+def get_page_head():
+    # Built once per process; reruns only resend these few tags
+    font_css, font_preloads = get_font_assets()
+    return "".join([
+        '<meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=5.0, user-scalable=yes">',
+        *(f'<link rel="preload" href="{url}" as="font" type="font/woff2" crossorigin>' for url in font_preloads),
+        f'<link rel="stylesheet" href="{font_css}">',
+        f'<link rel="stylesheet" href="{build_stylesheet("app.css")}">',
+    ])
 
-    /* Open icon button inside recent-cases card */
-    [data-testid="stVerticalBlockBorderWrapper"] .stButton > button[kind="secondary"] {
-        background: transparent !important;
-        border: none !important;
-        font-size: 1.4rem !important;
-        font-weight: 400 !important;
-        padding: 0 !important;
-        width: auto !important;
-        min-height: 0 !important;
-        height: auto !important;
-        color: #333 !important;
-    }
 
-    /* Case entries inside the recent-cases card – remove all spacing */
-    [data-testid="stVerticalBlockBorderWrapper"] [data-testid="column"] > div {
-        gap: 0 !important;
-    }
-    [data-testid="stVerticalBlockBorderWrapper"] [data-testid="column"] [data-testid="stVerticalBlock"] {
-        gap: 0 !important;
-    }
-    [data-testid="stVerticalBlockBorderWrapper"] .stMarkdown {
-        margin: 0 !important;
-        padding: 0 !important;
-    }
-    [data-testid="stVerticalBlockBorderWrapper"] [data-testid="element-container"] {
-        margin: 0 !important;
-    }
-</style>
-""", unsafe_allow_html=True)
+st.markdown(get_page_head(), unsafe_allow_html=True)
 
 # ── Session state defaults ──────────────────────────────────────────────
 if "page" not in st.session_state:
@@ -535,9 +136,19 @@ if "refresh_token" not in st.session_state:
     st.session_state.refresh_token = None
 if "selected_case_id" not in st.session_state:
     st.session_state.selected_case_id = None
+if "auth_error" not in st.session_state:
+    st.session_state.auth_error = None
+if "recent_more" not in st.session_state:
+    st.session_state.recent_more = None
+if "realtime_channel" not in st.session_state:
+    # Names the BroadcastChannel the nav's realtime socket relays changes on
+    st.session_state.realtime_channel = f"be-well-{uuid4().hex}"
 
 
 # ── Helpers ─────────────────────────────────────────────────────────────
+CHILD_SEARCH_MIN_CHARS = 2
+
+
 def navigate(page: str):
     st.session_state.page = page
 
@@ -548,136 +159,129 @@ def require_auth():
         st.rerun()
 
 
-def do_logout():
-    try:
-        sb.auth.sign_out()
-    except Exception:
-        pass
+def clear_session():
     for key in ["user_id", "display_name", "role", "centre_ids", "access_token", "refresh_token"]:
         st.session_state[key] = None if key != "centre_ids" else []
     st.session_state.display_name = ""
     st.session_state.role = ""
+    st.session_state.recent_more = None
+
+
+def do_logout():
+    # Queued writes wait for this user's next sign-in
+    get_outbox().unregister(st.session_state.user_id, db)
+    auth.sign_out()
+    clear_session()
     navigate("login")
     st.rerun()
 
 
-def render_header(page_key=""):
-    initial = (st.session_state.display_name or "U")[0].upper()
-    # Hidden button for logout trigger
-    st.markdown('<span class="hide-next-btn"></span>', unsafe_allow_html=True)
-    logout_clicked = st.button("logout_trigger", key=f"logout_{page_key}")
-    # Full header bar with bell, avatar, and logout via components.html
-    components.html(
-        f"""
-        <style>
-            @import url('https://fonts.googleapis.com/css2?family=Montserrat:wght@600;700&display=swap');
-            * {{ margin:0; padding:0; box-sizing:border-box; }}
-            .app-header {{
-                display: flex; align-items: center; justify-content: flex-end;
-                gap: 12px; padding: 6px 0; font-family: 'Montserrat', sans-serif;
-            }}
-            .header-bell {{ display:flex; align-items:center; cursor:pointer; }}
-            .header-avatar {{
-                width:clamp(38px, 10vw, 48px); height:clamp(38px, 10vw, 48px);
-                border-radius:50%; background:#52AB98;
-                display:flex; align-items:center; justify-content:center;
-                color:white; font-weight:700; font-size:clamp(0.9rem, 2.5vw, 1.1rem);
-            }}
-            .logout-btn {{
-                display:inline-flex; align-items:center; justify-content:center;
-                width:clamp(38px, 10vw, 48px); height:clamp(38px, 10vw, 48px);
-                border-radius:50%;
-                background:transparent; border:1.5px solid #ddd;
-                cursor:pointer; text-decoration:none;
-            }}
-            .logout-btn:hover {{ background:#D32F2F; border-color:#D32F2F; }}
-            .logout-btn:hover svg {{ stroke:white; }}
-        </style>
-        <div class="app-header">
-            <div class="header-bell">
-                <svg xmlns="http://www.w3.org/2000/svg" width="24" height="24" viewBox="0 0 24 24"
-                     fill="none" stroke="#333" stroke-width="2" stroke-linecap="round" stroke-linejoin="round">
-                    <path d="M18 8A6 6 0 0 0 6 8c0 7-3 9-3 9h18s-3-2-3-9"/>
-                    <path d="M13.73 21a2 2 0 0 1-3.46 0"/>
-                </svg>
-            </div>
-            <div class="header-avatar">{initial}</div>
-            <div class="logout-btn" onclick="triggerLogout()" ontouchend="triggerLogout()">
-                <svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" viewBox="0 0 24 24"
-                     fill="none" stroke="#D32F2F" stroke-width="2" stroke-linecap="round" stroke-linejoin="round">
-                    <path d="M9 21H5a2 2 0 0 1-2-2V5a2 2 0 0 1 2-2h4"/>
-                    <polyline points="16 17 21 12 16 7"/>
-                    <line x1="21" y1="12" x2="9" y2="12"/>
-                </svg>
-            </div>
-        </div>
-        <script>
-            function triggerLogout() {{
-                try {{
-                    const buttons = window.parent.document.querySelectorAll('button');
-                    for (const b of buttons) {{
-                        if (b.innerText.trim() === 'logout_trigger') {{ b.click(); return; }}
-                    }}
-                }} catch(e) {{}}
-            }}
-        </script>
-        """,
-        height=60,
-    )
-    if logout_clicked:
-        do_logout()
+def restore_session():
+    """Reuse stored tokens; only hits Supabase Auth when the JWT has expired."""
+    if not (st.session_state.access_token and st.session_state.refresh_token):
+        return
+    if auth.access_token is None:
+        auth.start(st.session_state.access_token, st.session_state.refresh_token)
+    try:
+        st.session_state.access_token, st.session_state.refresh_token = auth.ensure_valid()
+    except AuthUnavailableError:
+        # Auth is down, not the session: keep it and let the user try again
+        st.warning("Can't reach the sign-in service right now. You're still signed in.")
+        st.button("Try again")
+        st.stop()
+    except AuthSessionError:
+        # As in do_logout: queued writes must not go out over the anon client
+        get_outbox().unregister(st.session_state.user_id, db)
+        auth.sign_out()
+        clear_session()
+        st.session_state.auth_error = "Your session has expired. Please sign in again."
+        navigate("login")
 
 
-def render_back_nav(label, button_key):
-    """Render a clickable h2 back nav that triggers a hidden Streamlit button."""
-    # Marker to hide the next button via CSS
-    st.markdown('<span class="hide-next-btn"></span>', unsafe_allow_html=True)
-    clicked = st.button(button_key, key=button_key)
+def realtime_config():
+    """Settings for the nav's Supabase Realtime socket, or None when signed out."""
+    if not st.session_state.access_token:
+        return None
+    return {
+        "url": get_supabase_pool().realtime_url,
+        "apikey": SUPABASE_KEY,
+        "access_token": st.session_state.access_token,
+        "channel": st.session_state.realtime_channel,
+        "role": st.session_state.role,
+        "user_id": st.session_state.user_id,
+    }
 
-    # Clickable h2 via components.html (supports onclick JS)
-    components.html(
-        f"""
-        <style>
-            @import url('https://fonts.googleapis.com/css2?family=Montserrat:wght@800&display=swap');
-            * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-            .back-h2 {{
-                font-family: 'Montserrat', sans-serif;
-                font-size: clamp(1rem, 2.5vw, 1.8rem);
-                font-weight: 800;
-                color: #1E1E1E;
-                cursor: pointer;
-                margin: 0;
-                padding: 4px 0;
-                user-select: none;
-                white-space: nowrap;
-                overflow: hidden;
-                text-overflow: ellipsis;
-            }}
-            .back-h2:hover {{ color: #2B6777; }}
-            @media (max-width: 360px) {{
-                .back-h2 {{ font-size: 0.95rem; }}
-            }}
-        </style>
-        <h2 class="back-h2" onclick="triggerBack()" ontouchend="triggerBack()">‹ {label}</h2>
-        <script>
-            function triggerBack() {{
-                try {{
-                    const buttons = window.parent.document.querySelectorAll('button');
-                    for (const b of buttons) {{
-                        if (b.innerText.trim() === '{button_key}') {{ b.click(); return; }}
-                    }}
-                }} catch(e) {{}}
-            }}
-        </script>
-        """,
-        height=40,
-    )
 
-    if clicked:
+def render_nav(back_label=None, seen_case_id=None):
+    """Header bar with bell and logout, plus a "‹ back_label" link to home when given."""
+    try:
+        pending = db.counters.pending_count(st.session_state.user_id)
+    except Exception as e:
+        if not is_backend_failure(e):
+            raise
+        pending = 0  # counters unreachable (or their breaker open): not worth failing the page for
+    action = app_nav(
+        (st.session_state.display_name or "U")[0].upper(),
+        back_label,
+        get_font_assets()[0],
+        realtime=realtime_config(),
+        pending=pending,
+        seen_ids=[seen_case_id] if seen_case_id else [],
+    )
+    if action == "logout":
+        do_logout()
+    elif action in ("back", "bell"):
         navigate("home")
         st.rerun()
 
 
+def case_thumbnail_html(case, size=64):
+    """Square list thumbnail; uses the 128/256px variants, never the full photo."""
+    style = f"width:{size}px;height:{size}px;min-width:{size}px;object-fit:cover;border-radius:12px;"
+    upload_status = get_photo_uploader().status(case["id"])
+    if upload_status and not case.get("photo_url"):
+        label = "Uploading…" if upload_status == "pending" else "Upload failed"
+        return (
+            f'<div style="{style}background:#e8e8e8;display:flex;align-items:center;justify-content:center;'
+            f'font-size:0.6rem;color:#888;text-align:center;">{label}</div>'
+        )
+    thumb = case.get("thumb_url")
+    if thumb:
+        thumb_2x = case.get("thumb_url_2x") or thumb
+        return f'<img src="{thumb}" srcset="{thumb} 1x, {thumb_2x} 2x" loading="lazy" style="{style}">'
+    if case.get("photo_url"):
+        # Cases uploaded before thumbnails existed
+        return f'<img src="{case["photo_url"]}" loading="lazy" style="{style}">'
+    return f'<div style="{style}background:#e8e8e8;"></div>'
+
+
+def load_case(case_id, view):
+    """Fetch a case for ``view`` (child name embedded); show an error and return None if unavailable."""
+    try:
+        case = db.cases.load(case_id, view, st.session_state.user_id)
+    except Exception as e:
+        st.error(f"Failed to load case: {e}")
+        return None
+    if not case:
+        st.warning("Case not found.")
+    stale_notice("cases")
+    return case
+
+
+def stale_notice(table):
+    """Say so when ``table`` was served from saved data because Supabase is unavailable."""
+    if db.take_stale(table):
+        st.caption("⚠️ Can't reach the server right now – showing the last saved copy.")
+
+
+def case_child_names(case):
+    """``(first_name, full_name)`` from the child embedded by the case loader."""
+    child = case.get("child")
+    if not child:
+        return "", "Child"
+    return child["first_name"], f"{child['first_name']} {child['last_name']}"
+
+
 def format_date_display(date_str):
     try:
         dt = datetime.fromisoformat(date_str)
@@ -698,6 +302,9 @@ def format_time_display(created_at):
 def login_screen():
     st.markdown("<div style='height:3rem;'></div>", unsafe_allow_html=True)
 
+    if st.session_state.auth_error:
+        st.info(st.session_state.auth_error)
+
     st.markdown(
         "<h2 style='text-align:center;font-weight:800;margin-bottom:0.2rem;font-size:clamp(1.4rem,4vw,2rem);'>Welcome Back!</h2>",
         unsafe_allow_html=True,
@@ -723,25 +330,21 @@ def login_screen():
             st.warning("Please enter both email and password.")
         else:
             try:
-                res = sb.auth.sign_in_with_password({"email": email, "password": password})
+                res = auth.sign_in_with_password({"email": email, "password": password})
                 user = res.user
                 session = res.session
 
                 st.session_state.user_id = user.id
                 st.session_state.access_token = session.access_token
                 st.session_state.refresh_token = session.refresh_token
-
-                profile = (
-                    sb.table("users")
-                    .select("display_name, role, centre_ids")
-                    .eq("id", user.id)
-                    .maybe_single()
-                    .execute()
-                )
-                if profile.data:
-                    st.session_state.display_name = profile.data.get("display_name", email)
-                    st.session_state.role = profile.data.get("role", "")
-                    st.session_state.centre_ids = profile.data.get("centre_ids", []) or []
+                st.session_state.auth_error = None
+                auth.start(session.access_token, session.refresh_token)
+
+                profile = db.users.get_profile(user.id)
+                if profile:
+                    st.session_state.display_name = profile.get("display_name", email)
+                    st.session_state.role = profile.get("role", "")
+                    st.session_state.centre_ids = profile.get("centre_ids", []) or []
                 else:
                     st.session_state.display_name = email.split("@")[0].title()
 
@@ -791,9 +394,10 @@ def login_screen():
 def home_screen():
     require_auth()
 
-    render_header("home")
+    render_nav()
 
     role = st.session_state.role
+    user_id = st.session_state.user_id
 
     if role == "parent":
         st.markdown("<div class='carer-home-title'>Parent Home</div>", unsafe_allow_html=True)
@@ -808,106 +412,172 @@ def home_screen():
 
     st.markdown("<div style='height:0.75rem;'></div>", unsafe_allow_html=True)
 
+    recent_cases_region(role, user_id)
+
+
+@st.fragment
+def recent_cases_region(role, user_id):
+    """Recent Cases list; reruns on its own for its buttons and for pushed case changes."""
+    db.begin_fragment()
+    changes = live_changes(st.session_state.realtime_channel)
+    if changes:
+        db.cases.apply_remote_changes(changes, role, user_id)
+
     # Fetch cases
     try:
-        user_id = st.session_state.user_id
+        cases, child_map, cursor = db.cases.recent_for_user(role, user_id)
 
-        if role == "parent":
-            children_res = (
-                sb.table("children")
-                .select("id, first_name, last_name")
-                .contains("parent_ids", [user_id])
-                .execute()
-            )
-            parent_children = children_res.data or []
-            child_ids = [ch["id"] for ch in parent_children]
-            child_map = {ch["id"]: f"{ch['first_name']} {ch['last_name']}" for ch in parent_children}
-
-            if child_ids:
-                cases_res = (
-                    sb.table("cases")
-                    .select("id, child_id, symptom_date, symptom_description, status, created_at, photo_url")
-                    .in_("child_id", child_ids)
-                    .order("created_at", desc=True)
-                    .limit(20)
-                    .execute()
-                )
-                cases = cases_res.data or []
-            else:
-                cases = []
-        else:
-            cases_res = (
-                sb.table("cases")
-                .select("id, child_id, symptom_date, symptom_description, status, created_at, photo_url")
-                .eq("reported_by", user_id)
-                .order("created_at", desc=True)
-                .limit(20)
-                .execute()
-            )
-            cases = cases_res.data or []
-
-            child_ids_set = list({c["child_id"] for c in cases if c.get("child_id")})
-            child_map = {}
-            if child_ids_set:
-                children_res = (
-                    sb.table("children")
-                    .select("id, first_name, last_name")
-                    .in_("id", child_ids_set)
-                    .execute()
-                )
-                for ch in children_res.data or []:
-                    child_map[ch["id"]] = f"{ch['first_name']} {ch['last_name']}"
+        # Older pages loaded with "Load more" this session (keyset cursor)
+        more = st.session_state.recent_more
+        if not more or more["owner"] != (role, user_id):
+            more = st.session_state.recent_more = {"owner": (role, user_id), "cases": [], "child_map": {}, "cursor": None}
+        if more["cases"]:
+            shown = {c["id"] for c in cases}
+            cases = cases + [c for c in more["cases"] if c["id"] not in shown]
+            child_map = {**child_map, **more["child_map"]}
+            cursor = more["cursor"]
+
+        cases, child_map = with_queued_writes(cases, child_map, user_id)
+        stale_notice("cases")
 
         if not cases:
             st.info("No cases yet. Tap **New Case** to get started." if role != "parent" else "No cases to review.")
         else:
-            # Recent Cases inside a single bordered container (card)
-            with st.container(border=True):
-                st.markdown(
-                    "<div style='font-size:1rem;font-weight:700;display:flex;align-items:center;gap:8px;margin-bottom:0.5rem;'>"
-                    "<svg xmlns='http://www.w3.org/2000/svg' width='20' height='20' viewBox='0 0 24 24' fill='none' stroke='#333' stroke-width='2' stroke-linecap='round' stroke-linejoin='round'><circle cx='12' cy='12' r='10'/><polyline points='12 6 12 12 16 14'/></svg>"
-                    " Recent Cases</div>",
-                    unsafe_allow_html=True,
-                )
-
-                for case in cases:
-                    child_name = child_map.get(case.get("child_id"), "Unknown Child")
-                    display_date = format_date_display(case.get("symptom_date", ""))
-                    symptom = case.get("symptom_description", "")
-                    photo_url = case.get("photo_url", "")
-                    case_id = case["id"]
-
-                    img_html = (
-                        f'<img src="{photo_url}" style="width:64px;height:64px;min-width:64px;object-fit:cover;border-radius:12px;">'
-                        if photo_url
-                        else '<div style="width:64px;height:64px;min-width:64px;background:#e8e8e8;border-radius:12px;"></div>'
-                    )
-
-                    # Case row as markdown + native button
-                    st.markdown(
-                        f"""<div style="display:flex;align-items:center;gap:12px;padding:8px 4px;border-bottom:1px solid #f0f0f0;">
-                            {img_html}
-                            <div style="flex:1;min-width:0;">
-                                <div style="font-size:0.72rem;color:#2B6777;font-weight:500;">{display_date}</div>
-                                <div style="font-size:0.92rem;font-weight:700;color:#1E1E1E;white-space:nowrap;overflow:hidden;text-overflow:ellipsis;">{child_name}</div>
-                                <div style="font-size:0.82rem;color:#555;white-space:nowrap;overflow:hidden;text-overflow:ellipsis;">{symptom}</div>
-                            </div>
-                        </div>""",
-                        unsafe_allow_html=True,
-                    )
-                    clicked = st.button("View ↗", key=f"case_{case_id}", type="secondary")
-                    if clicked:
-                        st.session_state.selected_case_id = case_id
-                        if role == "parent":
-                            navigate("acknowledge_report")
-                        else:
-                            navigate("case_details")
-                        st.rerun()
+            recent_cases_card(cases, child_map, cursor, role, user_id)
+            # Warm the detail screen the "View" buttons lead to
+            view = "acknowledge" if role == "parent" else "details"
+            get_case_prefetcher().submit(db, [c["id"] for c in cases], view, user_id)
 
     except Exception as e:
         st.error(f"Failed to load cases: {e}")
 
 
+def with_queued_writes(cases, child_map, user_id):
+    """Overlay this user's undelivered outbox writes on the fetched list.
+
+    Queued cases are shown at the top until they land; cases with a queued
+    acknowledgement already read as acknowledged. Cached rows are copied,
+    never modified.
+    """
+    queued = get_outbox().pending(user_id)
+    if not queued:
+        return cases, child_map
+    shown = {c["id"] for c in cases}
+    # A failed acknowledgement shows as unacknowledged, so it can be given again
+    acked = {e["payload"]["id"] for e in queued if e["kind"] == ACKNOWLEDGE and e["status"] == "pending"}
+    child_map = dict(child_map)
+    new_cases = []
+    for entry in queued:
+        case = entry["payload"]
+        if entry["kind"] != INSERT_CASE or case["id"] in shown:
+            continue
+        new_cases.append({**case, "_queued": entry["status"]})
+        child_map.setdefault(case.get("child_id"), entry["meta"].get("child_name") or "Unknown Child")
+    cases = [{**c, "status": "acknowledged"} if c["id"] in acked else c for c in cases]
+    return new_cases[::-1] + cases, child_map
+
+
+def recent_cases_card(cases, child_map, cursor, role, user_id):
+    """Recent Cases card, rendered inside ``recent_cases_region``."""
+    # Recent Cases inside a single bordered container (card)
+    with st.container(border=True):
+        st.markdown(
+            "<div style='font-size:1rem;font-weight:700;display:flex;align-items:center;gap:8px;margin-bottom:0.5rem;'>"
+            "<svg xmlns='http://www.w3.org/2000/svg' width='20' height='20' viewBox='0 0 24 24' fill='none' stroke='#333' stroke-width='2' stroke-linecap='round' stroke-linejoin='round'><circle cx='12' cy='12' r='10'/><polyline points='12 6 12 12 16 14'/></svg>"
+            " Recent Cases</div>",
+            unsafe_allow_html=True,
+        )
+
+        for case in cases:
+            child_name = child_map.get(case.get("child_id"), "Unknown Child")
+            display_date = format_date_display(case.get("symptom_date", ""))
+            symptom = case.get("symptom_description", "")
+            case_id = case["id"]
+
+            img_html = case_thumbnail_html(case)
+
+            # Case row as markdown + native button
+            st.markdown(
+                f"""<div style="display:flex;align-items:center;gap:12px;padding:8px 4px;border-bottom:1px solid #f0f0f0;">
+                    {img_html}
+                    <div style="flex:1;min-width:0;">
+                        <div style="font-size:0.72rem;color:#2B6777;font-weight:500;">{display_date}</div>
+                        <div style="font-size:0.92rem;font-weight:700;color:#1E1E1E;white-space:nowrap;overflow:hidden;text-overflow:ellipsis;">{child_name}</div>
+                        <div style="font-size:0.82rem;color:#555;white-space:nowrap;overflow:hidden;text-overflow:ellipsis;">{symptom}</div>
+                    </div>
+                </div>""",
+                unsafe_allow_html=True,
+            )
+            if case.get("_queued") == "failed":
+                st.caption("Not sent")
+                retry_col, discard_col = st.columns(2)
+                if retry_col.button("Retry", key=f"outbox_retry_{case_id}", type="secondary"):
+                    get_outbox().retry(user_id, case_id)
+                    st.rerun(scope="fragment")
+                if discard_col.button("Discard", key=f"outbox_discard_{case_id}", type="secondary"):
+                    get_outbox().discard(user_id, case_id)
+                    get_photo_uploader().forget(case_id)
+                    st.rerun(scope="fragment")
+                continue
+            if case.get("_queued"):
+                # Not in Supabase yet; the outbox flusher is still sending it.
+                # Sending needs this sign-in, which logging out (or a server
+                # restart) drops until the user signs in again
+                st.caption("Sending… Stay signed in until it's sent.")
+                continue
+            if role == "parent" and case.get("status") != "acknowledged":
+                st.checkbox("Select", key=f"bulk_ack_{case_id}")
+            clicked = st.button("View ↗", key=f"case_{case_id}", type="secondary")
+            if clicked:
+                st.session_state.selected_case_id = case_id
+                if role == "parent":
+                    navigate("acknowledge_report")
+                else:
+                    navigate("case_details")
+                st.rerun()
+
+        if role == "parent":
+            bulk_acknowledge_controls(cases, user_id)
+
+        if cursor and st.button("Load more", key="load_more_cases", type="secondary"):
+            try:
+                older, older_map, next_cursor = db.cases.more_for_user(role, user_id, cursor)
+            except Exception as e:
+                st.error(f"Failed to load cases: {e}")
+                return
+            more = st.session_state.recent_more
+            more["cases"].extend(older)
+            more["child_map"].update(older_map)
+            more["cursor"] = next_cursor
+            st.rerun(scope="fragment")  # only the list changed; skip the nav's count query
+
+
+def bulk_acknowledge_controls(cases, user_id):
+    """Acknowledge the cases ticked in the list with one batched update."""
+    selected = [c["id"] for c in cases if st.session_state.get(f"bulk_ack_{c['id']}")]
+    if not selected:
+        return
+    st.checkbox("I have read and understood the selected updates.", key="bulk_ack_confirm")
+    if st.button(f"Acknowledge selected ({len(selected)})", key="bulk_ack", type="primary"):
+        if not st.session_state.get("bulk_ack_confirm"):
+            st.warning("Please confirm you have read and understood the selected updates.")
+            return
+        try:
+            get_outbox().enqueue_acknowledge(user_id, selected)
+        except Exception as e:
+            st.error(f"Failed to acknowledge: {e}")
+            return
+        # Older pages are held in the session, not the cache
+        more = st.session_state.recent_more
+        for case in more["cases"] if more else []:
+            if case["id"] in selected:
+                case["status"] = "acknowledged"
+        for case_id in selected:
+            st.session_state.pop(f"bulk_ack_{case_id}", None)
+        st.session_state.pop("bulk_ack_confirm", None)
+        st.rerun()
+
+
 # ── Screen 3 – Symptom Entry ──────────────────────────────────────────
 def symptom_entry_screen():
     require_auth()
@@ -917,90 +587,48 @@ def symptom_entry_screen():
         navigate("home")
         st.rerun()
 
-    render_header("symptom")
-
-    render_back_nav("Symptom Entry", "back_symptom")
+    render_nav("Symptom Entry")
 
     st.markdown(
         "<p style='color:#888;font-size:0.88rem;margin-top:-0.5rem;'>Describe what you're seeing</p>",
         unsafe_allow_html=True,
     )
 
-    # Fetch children
+    # Own and recently reported children ("Parent - Child" labels resolved server-side)
     user_id = st.session_state.user_id
-    children = []
-    parent_map = {}
-
+    centre_ids = st.session_state.centre_ids or []
     try:
-        children_res = (
-            sb.table("children")
-            .select("id, first_name, last_name, centre_id, parent_ids")
-            .or_(f"carer_ids.cs.{{{user_id}}},parent_ids.cs.{{{user_id}}}")
-            .execute()
-        )
-        children = children_res.data or []
-    except Exception:
-        pass
+        children = db.children.roster(user_id, centre_ids)
+    except Exception as e:
+        st.error(f"Failed to load children: {e}")
+        children = []
 
-    if not children:
-        try:
-            centre_ids = st.session_state.centre_ids or []
-            if centre_ids:
-                children_res = (
-                    sb.table("children")
-                    .select("id, first_name, last_name, centre_id, parent_ids")
-                    .in_("centre_id", centre_ids)
-                    .execute()
-                )
-                children = children_res.data or []
-        except Exception:
-            pass
+    st.markdown("<p style='font-weight:700;font-size:0.95rem;margin-bottom:2px;'>Name Child</p>", unsafe_allow_html=True)
+    query = st.text_input(
+        "Search child",
+        placeholder="Search by name…",
+        key="child_search",
+        label_visibility="collapsed",
+    ).strip()
 
-    if not children:
+    # Anyone else is found by a top-N server-side name search
+    if len(query) >= CHILD_SEARCH_MIN_CHARS:
         try:
-            children_res = (
-                sb.table("children")
-                .select("id, first_name, last_name, centre_id, parent_ids")
-                .execute()
-            )
-            children = children_res.data or []
+            matches = db.children.search(query, user_id, centre_ids)
         except Exception as e:
-            st.error(f"Failed to load children: {e}")
+            st.error(f"Child search failed: {e}")
+            matches = []
+        if matches:
+            children = matches
+        else:
+            st.info(f"No children match “{query}”.")
+    stale_notice("children")
 
     if not children:
-        st.warning("No children assigned to you.")
+        st.warning("No children assigned to you. Search by name above.")
         return
 
-    # Fetch parent names for "Parent Name - Child Name" format
-    all_parent_ids = set()
-    for ch in children:
-        for pid in (ch.get("parent_ids") or []):
-            all_parent_ids.add(pid)
-
-    if all_parent_ids:
-        try:
-            parents_res = (
-                sb.table("users")
-                .select("id, display_name")
-                .in_("id", list(all_parent_ids))
-                .execute()
-            )
-            for p in parents_res.data or []:
-                parent_map[p["id"]] = p["display_name"]
-        except Exception:
-            pass
-
-    child_options = {}
-    for ch in children:
-        child_full = f"{ch['first_name']} {ch['last_name']}"
-        parent_ids = ch.get("parent_ids") or []
-        if parent_ids and parent_ids[0] in parent_map:
-            label = f"{parent_map[parent_ids[0]]} - {child_full}"
-        else:
-            label = child_full
-        child_options[label] = ch
-
-    st.markdown("<p style='font-weight:700;font-size:0.95rem;margin-bottom:2px;'>Name Child</p>", unsafe_allow_html=True)
+    child_options = {ch["label"]: ch for ch in children}
     selected_name = st.selectbox("Name Child", list(child_options.keys()), label_visibility="collapsed")
     selected_child = child_options[selected_name]
 
@@ -1025,33 +653,30 @@ def symptom_entry_screen():
             st.warning("Please describe the symptoms before submitting.")
         else:
             try:
-                photo_url = None
-                if photo:
-                    try:
-                        import time as _time
-                        unique_name = f"{int(_time.time())}_{photo.name}"
-                        file_path = f"cases/{user_id}/{entry_date.isoformat()}_{unique_name}"
-                        sb.storage.from_("case-photos").upload(
-                            file_path,
-                            photo.getvalue(),
-                            {"content-type": photo.type},
-                        )
-                        photo_url = sb.storage.from_("case-photos").get_public_url(file_path)
-                    except Exception as upload_err:
-                        st.warning(f"Photo upload failed: {upload_err}")
-
+                case_id = str(uuid4())
                 case_data = {
+                    "id": case_id,
                     "child_id": selected_child["id"],
                     "centre_id": selected_child.get("centre_id"),
                     "reported_by": user_id,
                     "symptom_date": entry_date.isoformat(),
                     "symptom_description": symptoms.strip(),
+                    # Flagged locally so urgent cases show up before any guidance arrives
+                    "red_flags": get_red_flag_detector().scan(symptoms),
                     "status": "pending",
                 }
-                if photo_url:
-                    case_data["photo_url"] = photo_url
 
-                sb.table("cases").insert(case_data).execute()
+                # Committed locally first; the outbox flusher sends it to Supabase
+                get_outbox().enqueue_case(
+                    user_id,
+                    case_data,
+                    parent_ids=selected_child.get("parent_ids"),
+                    child_name=f"{selected_child['first_name']} {selected_child['last_name']}",
+                )
+                if photo:
+                    # Upload off the request path; the photo is attached once the case lands
+                    get_photo_uploader().submit(db, case_id, user_id, entry_date, photo.name, photo)
+                    st.toast("Photo uploading in the background")
                 st.success(f"Case for {selected_child['first_name']} {selected_child['last_name']} saved!")
                 navigate("home")
                 st.rerun()
@@ -1068,56 +693,27 @@ def case_details_screen():
         navigate("home")
         st.rerun()
 
-    render_header("case")
-
-    render_back_nav("Case Details", "back_case")
-
-    # Fetch case
-    try:
-        case_res = (
-            sb.table("cases")
-            .select("*")
-            .eq("id", case_id)
-            .maybe_single()
-            .execute()
-        )
-        case = case_res.data
-    except Exception as e:
-        st.error(f"Failed to load case: {e}")
-        return
+    render_nav("Case Details", seen_case_id=case_id)
 
+    case = load_case(case_id, "details")
     if not case:
-        st.warning("Case not found.")
         return
-
-    # Fetch child name
-    child_name = "Child"
-    first_name = ""
-    try:
-        child_res = (
-            sb.table("children")
-            .select("first_name, last_name")
-            .eq("id", case["child_id"])
-            .maybe_single()
-            .execute()
-        )
-        if child_res.data:
-            first_name = child_res.data["first_name"]
-            child_name = f"{first_name} {child_res.data['last_name']}"
-    except Exception:
-        pass
+    first_name, child_name = case_child_names(case)
 
     # Submitted time
     submitted_str = format_time_display(case.get("created_at", ""))
     st.markdown(f"<p class='submitted-meta'>{submitted_str}</p>", unsafe_allow_html=True)
 
-    # Symptoms section in card
+    # Symptoms section in card (the only screen that loads the full photo)
     symptom_text = case.get("symptom_description", "")
+    photo_url = case.get("photo_url")
+    photo_html = f'<img class="case-photo" src="{photo_url}" alt="Case photo">' if photo_url else ""
     st.markdown(
         f"""
         <div class="symptom-section-card">
             <p style="font-weight:700;font-size:1.05rem;margin:0 0 0.5rem 0;">{first_name or child_name.split()[0]}'s Symptoms</p>
             <div class="symptom-bubble">{symptom_text}</div>
+            {photo_html}
         </div>
         """,
         unsafe_allow_html=True,
@@ -1145,11 +741,15 @@ def case_details_screen():
             unsafe_allow_html=True,
         )
     else:
+        if case.get("status") == GUIDANCE_FAILED:
+            note = "AI guidance could not be generated for this case. Please review the symptoms yourself."
+        else:
+            note = "No AI guidance available for this case yet."
         st.markdown(
-            """
+            f"""
             <div class="ai-card">
                 <h4>AI Guidance</h4>
-                <p class="ai-text" style="color:#888;">No AI guidance available for this case yet.</p>
+                <p class="ai-text" style="color:#888;">{note}</p>
             </div>
             """,
             unsafe_allow_html=True,
@@ -1181,44 +781,12 @@ def acknowledge_report_screen():
         navigate("home")
         st.rerun()
 
-    render_header("ack")
-
-    render_back_nav("Acknowledge Report", "back_ack")
-
-    # Fetch case
-    try:
-        case_res = (
-            sb.table("cases")
-            .select("*")
-            .eq("id", case_id)
-            .maybe_single()
-            .execute()
-        )
-        case = case_res.data
-    except Exception as e:
-        st.error(f"Failed to load case: {e}")
-        return
+    render_nav("Acknowledge Report", seen_case_id=case_id)
 
+    case = load_case(case_id, "acknowledge")
     if not case:
-        st.warning("Case not found.")
         return
-
-    # Fetch child name
-    child_name = "Child"
-    first_name = ""
-    try:
-        child_res = (
-            sb.table("children")
-            .select("first_name, last_name")
-            .eq("id", case["child_id"])
-            .maybe_single()
-            .execute()
-        )
-        if child_res.data:
-            first_name = child_res.data["first_name"]
-            child_name = f"{first_name} {child_res.data['last_name']}"
-    except Exception:
-        pass
+    first_name, child_name = case_child_names(case)
 
     # Health Update card
     created = case.get("created_at", "")
@@ -1244,6 +812,8 @@ def acknowledge_report_screen():
     red_flags = case.get("red_flags", []) or []
 
     guidance_body = ai_guidance or symptom_text or "No guidance available yet."
+    if not ai_guidance and case.get("status") == GUIDANCE_FAILED:
+        guidance_body = f"AI guidance could not be generated for this case. Symptoms reported: {symptom_text}"
     red_flag_note = ""
     if red_flags:
         red_flag_note = "Watch for any <a href='#'>Red Flags</a>."
@@ -1261,27 +831,55 @@ def acknowledge_report_screen():
 
     st.markdown("<div style='height:0.5rem;'></div>", unsafe_allow_html=True)
 
-    # Acknowledge button
+    acknowledge_controls(case_id)
+
+
+@st.fragment
+def acknowledge_controls(case_id):
+    """Acknowledge button and checkbox; ticking the box reruns only this fragment."""
+    db.begin_fragment()
+    ack_key = f"ack_checked_{case_id}"
     if st.button("Acknowledge", type="primary"):
-        if not st.session_state.get("ack_checked"):
+        if not st.session_state.get(ack_key):
             st.warning("Please confirm you have read and understood this update.")
         else:
             try:
-                sb.table("cases").update({
-                    "acknowledged_by_parent": True,
-                    "status": "acknowledged",
-                }).eq("id", case_id).execute()
+                get_outbox().enqueue_acknowledge(st.session_state.user_id, [case_id])
                 st.success("Report acknowledged. Thank you!")
                 navigate("home")
                 st.rerun()
             except Exception as e:
                 st.error(f"Failed to acknowledge: {e}")
 
-    acknowledged = st.checkbox("I have read and understood this update.")
-    st.session_state["ack_checked"] = acknowledged
+    st.checkbox("I have read and understood this update.", key=ack_key)
+
+
+def render_debug_stats():
+    """Show transport counters when the app is opened with ?debug=1."""
+    if st.query_params.get("debug") != "1":
+        return
+    conn = get_supabase_pool().stats.snapshot()
+    st.caption(
+        f"Supabase connections: {conn['opened']} opened / {conn['reused']} reused "
+        f"({conn['requests']} requests)"
+    )
+    st.json(get_query_stats().snapshot(), expanded=False)
+    st.json(get_app_caches().stats(), expanded=False)
+    st.json({"photo_uploads": get_photo_uploader().stats()}, expanded=False)
+    st.json({"case_prefetch": get_case_prefetcher().stats()}, expanded=False)
+    st.json({"outbox": get_outbox().stats()}, expanded=False)
+    st.json({"breakers": get_supabase_pool().breakers.stats()}, expanded=False)
+    worker = get_guidance_worker()
+    if worker:
+        st.json({"guidance": worker.stats()}, expanded=False)
 
 
 # ── Router ─────────────────────────────────────────────────────────────
+restore_session()
+get_guidance_worker()
+if st.session_state.user_id:
+    get_outbox().register(st.session_state.user_id, db, auth)
+
 page = st.session_state.page
 
 if page == "login":
@@ -1297,3 +895,5 @@ elif page == "acknowledge_report":
 else:
     navigate("login")
     st.rerun()
+
+render_debug_stats()
@@ -0,0 +1,83 @@
+"""Static assets served through Streamlit's ``/app/static`` route.
+
+Stylesheets live in ``static/`` as readable source. At startup they are
+minified into a sibling ``.min.css`` file and linked with a content-hash
+query string, so the browser downloads them once and revalidates with
+ETag/Last-Modified, and every rerun ships only the ``<link>`` tag.
+Fonts are self-hosted WOFF2 files under ``static/fonts`` and preloaded.
+"""
+import hashlib
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+STATIC_URL = "app/static"
+
+# Every subset montserrat.css references (written by fetch_fonts.py)
+FONT_FILES = ("fonts/montserrat-latin.woff2", "fonts/montserrat-latin-ext.woff2")
+# Preloaded on every page; the latin-ext subset only loads when a page needs it
+PRELOAD_FONTS = FONT_FILES[:1]
+FONT_STYLESHEET = "fonts/montserrat.css"
+FONT_FALLBACK_URL = "https://fonts.googleapis.com/css2?family=Montserrat:wght@400..800&display=swap"
+
+_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_SPACE = re.compile(r"\s+")
+_PUNCT = re.compile(r"\s*([{};,>])\s*")
+
+
+def minify_css(css):
+    """Strip comments and redundant whitespace.
+
+    Deliberately conservative: spaces around ``:`` are kept because they
+    are significant in selectors such as ``a :hover``.
+    """
+    css = _COMMENT.sub("", css)
+    css = _SPACE.sub(" ", css)
+    css = _PUNCT.sub(r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+def build_stylesheet(name):
+    """Minify ``static/<name>`` and return its hash-versioned URL.
+
+    ``name`` may include a subdirectory; relative ``url()``s keep working
+    because the minified file is written next to its source.
+    """
+    with open(os.path.join(STATIC_DIR, name), encoding="utf-8") as f:
+        source = f.read()
+    minified = minify_css(source)
+    digest = hashlib.sha256(minified.encode("utf-8")).hexdigest()[:12]
+
+    min_name = f"{os.path.splitext(name)[0]}.min.css"
+    min_path = os.path.join(STATIC_DIR, min_name)
+    try:
+        with open(min_path, encoding="utf-8") as f:
+            current = f.read()
+    except FileNotFoundError:
+        current = None
+    if current != minified:
+        # Write-then-rename so a concurrent request never sees a partial file
+        tmp_path = f"{min_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(minified)
+        os.replace(tmp_path, min_path)
+
+    logger.info("stylesheet %s: %d -> %d bytes (v=%s)", name, len(source), len(minified), digest)
+    return f"{STATIC_URL}/{min_name}?v={digest}"
+
+
+def build_font_assets():
+    """Return ``(stylesheet_url, preload_urls)`` for the self-hosted fonts.
+
+    Falls back to Google Fonts, without preloads, when any of the WOFF2
+    files has not been fetched (see ``fetch_fonts.py``), rather than
+    serving a stylesheet whose other subset would 404.
+    """
+    missing = [f for f in FONT_FILES if not os.path.exists(os.path.join(STATIC_DIR, f))]
+    if missing:
+        logger.warning("fonts %s not found; using Google Fonts (run fetch_fonts.py)", ", ".join(missing))
+        return FONT_FALLBACK_URL, []
+    return build_stylesheet(FONT_STYLESHEET), [f"{STATIC_URL}/{f}" for f in PRELOAD_FONTS]
@@ -0,0 +1,161 @@
+"""Token-expiry-aware auth session handling for a ``SessionClient``.
+
+Access tokens are validated locally from their JWT ``exp`` claim, so a
+rerun with a still-valid token costs no auth round trip. A daemon timer
+refreshes the token shortly before it expires; the script thread picks
+up the new tokens on its next rerun. Once a session has had no rerun for
+``IDLE_TIMEOUT`` (e.g. its tab was closed), the timer stops; if it comes
+back, ``ensure_valid`` refreshes the expired token on demand.
+
+Only an explicit rejection by Supabase Auth (e.g. a revoked refresh
+token) ends a session. While Auth is unreachable the current token is
+kept as long as it is valid and the refresh is retried.
+"""
+import base64
+import json
+import os
+import threading
+import time
+
+from breaker import AUTH_BUDGET, is_backend_failure
+
+REFRESH_MARGIN = 60  # seconds before expiry to refresh in the background
+RETRY_DELAYS = (2, 5, 15, 30)
+IDLE_TIMEOUT = int(os.getenv("AUTH_IDLE_TIMEOUT", "1800"))  # seconds without a rerun
+
+
+class AuthSessionError(Exception):
+    """The stored session can no longer be used; the user must sign in again."""
+
+
+class AuthUnavailableError(Exception):
+    """An expired token could not be refreshed because Auth is unreachable; the session is kept."""
+
+
+def jwt_expiry(token):
+    """Return the ``exp`` claim of a JWT without verifying it, or None."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+        return int(exp) if exp else None
+    except (AttributeError, IndexError, ValueError, TypeError):
+        return None
+
+
+class SessionManager:
+    """Keeps a session client's tokens fresh without per-rerun auth calls."""
+
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.Lock()
+        self._timer = None
+        self._error = None
+        self._last_seen = time.monotonic()
+        self.access_token = None
+        self.refresh_token = None
+
+    def start(self, access_token, refresh_token):
+        """Adopt a token pair (after sign-in or on a new session client)."""
+        with self._lock:
+            self._error = None
+            self._last_seen = time.monotonic()
+            self._set_tokens(access_token, refresh_token)
+
+    def ensure_valid(self, touch=True):
+        """Return the current ``(access_token, refresh_token)``.
+
+        Only touches the network when the access token has already
+        expired (e.g. the background refresh could not run in time).
+        Raises ``AuthSessionError`` if the session cannot be recovered,
+        and ``AuthUnavailableError`` if Auth could not be reached to try.
+        ``touch=False`` (the outbox flusher) does not count as activity
+        for ``IDLE_TIMEOUT``.
+        """
+        with self._lock:
+            if touch:
+                self._last_seen = time.monotonic()
+            if self._error:
+                raise AuthSessionError(self._error)
+            if not self.access_token or not self.refresh_token:
+                raise AuthSessionError("No session")
+            exp = jwt_expiry(self.access_token)
+            if exp is None or exp <= time.time():
+                try:
+                    self._refresh()
+                except Exception as e:
+                    if is_backend_failure(e):
+                        raise AuthUnavailableError(str(e) or type(e).__name__) from e
+                    self._error = str(e) or type(e).__name__
+                    raise AuthSessionError(self._error) from e
+            return self.access_token, self.refresh_token
+
+    def sign_in_with_password(self, credentials):
+        """Sign in through the "auth" breaker; the caller adopts the tokens with ``start``."""
+        return self._client.breakers.call(
+            "auth", lambda: self._client.auth.sign_in_with_password(credentials), AUTH_BUDGET
+        )
+
+    def sign_out(self):
+        with self._lock:
+            self._cancel_timer()
+            token = self.access_token
+            self.access_token = None
+            self.refresh_token = None
+            self._error = None
+        if token:
+            try:
+                self._client.auth.admin.sign_out(token)
+            except Exception:
+                pass
+        self._client.bind(None)
+
+    # ── internals (call with self._lock held) ──
+    def _set_tokens(self, access_token, refresh_token):
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self._client.bind(access_token)
+        self._schedule(jwt_expiry(access_token))
+
+    def _refresh(self):
+        refresh_token = self.refresh_token
+        session = self._client.breakers.call(
+            "auth", lambda: self._client.auth.refresh_session(refresh_token), AUTH_BUDGET
+        ).session
+        self._set_tokens(session.access_token, session.refresh_token)
+
+    def _cancel_timer(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    def _schedule(self, exp, attempt=0):
+        self._cancel_timer()
+        if exp is None:
+            return
+        if attempt:
+            delay = RETRY_DELAYS[min(attempt, len(RETRY_DELAYS)) - 1]
+        else:
+            delay = max(exp - REFRESH_MARGIN - time.time(), 0)
+        self._timer = threading.Timer(delay, self._refresh_in_background, args=(attempt,))
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _refresh_in_background(self, attempt):
+        with self._lock:
+            self._timer = None
+            if not self.refresh_token:
+                return
+            if time.monotonic() - self._last_seen > IDLE_TIMEOUT:
+                return  # abandoned tab: stop refreshing; ensure_valid refreshes if it returns
+            try:
+                self._refresh()
+            except Exception as e:
+                if not is_backend_failure(e):
+                    self._error = str(e) or type(e).__name__
+                    return
+                # Keep retrying while the current token still works; once it
+                # expires, ensure_valid refreshes on the next rerun
+                exp = jwt_expiry(self.access_token)
+                if exp and exp > time.time():
+                    self._schedule(exp, attempt + 1)
@@ -0,0 +1,200 @@
+"""Circuit breakers and latency budgets for Supabase calls.
+
+Every data call runs under a per-call latency budget, a deadline for
+the whole call: the shared transport (``supabase_pool.CountingTransport``)
+applies what is left of it as the connect/read/write/pool timeout of each
+request the call sends, in place of the pool-wide ``REQUEST_TIMEOUT``, and
+refuses to start a request once it is spent. A call that still overruns
+(e.g. a slowly trickling response) counts as a failure. Calls are also grouped by target
+(a table, a Storage bucket, or "auth"), each behind its own breaker: after
+``BREAKER_FAILURES`` consecutive backend failures the breaker opens and
+calls to that target fail at once with ``CircuitOpenError`` for
+``BREAKER_RESET`` seconds, after which a single probe call is let
+through. A brownout therefore costs one timeout per target, not one per
+query on every rerun; the repos fall back to stale cache entries while a
+breaker is open.
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+from postgrest.exceptions import APIError
+from storage3.exceptions import StorageApiError
+from supabase_auth.errors import AuthApiError, AuthRetryableError
+
+READ_BUDGET = float(os.getenv("SUPABASE_READ_BUDGET", "4"))
+WRITE_BUDGET = float(os.getenv("SUPABASE_WRITE_BUDGET", "10"))
+STORAGE_BUDGET = float(os.getenv("SUPABASE_STORAGE_BUDGET", "60"))
+AUTH_BUDGET = float(os.getenv("SUPABASE_AUTH_BUDGET", "8"))
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", "30"))
+
+# PostgREST codes for "could not reach / talk to the database", and
+# SQLSTATE classes for connection loss, resource exhaustion and
+# cancelled (timed out) statements
+_BACKEND_CODES = ("PGRST000", "PGRST001", "PGRST002", "PGRST003")
+_BACKEND_SQLSTATE_CLASSES = ("08", "53", "57")
+
+_budget = contextvars.ContextVar("supabase_call_budget", default=None)
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name, retry_in):
+        super().__init__(f"{name} is unavailable right now; retrying in {max(retry_in, 0):.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class BudgetExceededError(httpx.TimeoutException):
+    """A request was about to start after its call's latency budget ran out."""
+
+
+def call_budget():
+    """The latency budget of the call running in this thread, or None."""
+    current = _budget.get()
+    return current[0] if current else None
+
+
+def remaining_budget():
+    """Seconds left before the running call's deadline, or None without a budget."""
+    current = _budget.get()
+    return current[1] - time.monotonic() if current else None
+
+
+@contextmanager
+def budget(seconds):
+    token = _budget.set((seconds, time.monotonic() + seconds))
+    try:
+        yield
+    finally:
+        _budget.reset(token)
+
+
+def is_backend_failure(exc):
+    """Whether ``exc`` means the backend is unhealthy (not that the request was wrong)."""
+    if isinstance(exc, (CircuitOpenError, httpx.TransportError, AuthRetryableError)):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    if isinstance(exc, AuthApiError):
+        return exc.status >= 500
+    if isinstance(exc, StorageApiError):
+        return str(exc.status).isdigit() and int(exc.status) >= 500
+    if isinstance(exc, APIError):
+        code = exc.code
+        if isinstance(code, int):
+            return code >= 500
+        code = str(code or "")
+        return code in _BACKEND_CODES or code[:2] in _BACKEND_SQLSTATE_CLASSES
+    return False
+
+
+class CircuitBreaker:
+    """Closed -> open after ``failures`` in a row -> half-open probe after ``reset_after``."""
+
+    def __init__(self, name, failures=BREAKER_FAILURES, reset_after=BREAKER_RESET):
+        self.name = name
+        self.failures = failures
+        self.reset_after = reset_after
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened_at = None
+        self._probing = False
+        self.trips = 0
+        self.rejected = 0
+        self.calls = 0
+        self.failed = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now):
+        if self._opened_at is None:
+            return "closed"
+        return "half_open" if now - self._opened_at >= self.reset_after else "open"
+
+    def before_call(self):
+        """Raise ``CircuitOpenError`` unless a call may go out now."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(now)
+            if state == "closed" or (state == "half_open" and not self._probing):
+                self._probing = state == "half_open"
+                self.calls += 1
+                return
+            self.rejected += 1
+            retry_in = self.reset_after - (now - self._opened_at)
+        raise CircuitOpenError(self.name, retry_in)
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failed += 1
+            self._consecutive += 1
+            # A failed probe re-opens at once; otherwise wait for the threshold
+            if self._probing or (self._opened_at is None and self._consecutive >= self.failures):
+                self._opened_at = time.monotonic()
+                self.trips += 1
+            self._probing = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self._state(time.monotonic()),
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "calls": self.calls,
+                "failed": self.failed,
+            }
+
+
+class Breakers:
+    """Process-wide breakers, one per table or bucket, created on first use."""
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_after=BREAKER_RESET):
+        self.failures = failures
+        self.reset_after = reset_after
+        self._lock = threading.Lock()
+        self._breakers = {}
+
+    def get(self, name):
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(name, self.failures, self.reset_after)
+            return breaker
+
+    def call(self, name, fn, seconds):
+        """Run ``fn()`` behind ``name``'s breaker with a ``seconds`` latency budget."""
+        breaker = self.get(name)
+        breaker.before_call()
+        start = time.monotonic()
+        try:
+            with budget(seconds):
+                result = fn()
+        except Exception as e:
+            if is_backend_failure(e):
+                breaker.record_failure()
+            else:
+                breaker.record_success()  # the backend answered; the request was at fault
+            raise
+        if time.monotonic() - start > seconds:
+            breaker.record_failure()  # answered, but too slowly to count as healthy
+        else:
+            breaker.record_success()
+        return result
+
+    def stats(self):
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {b.name: b.stats() for b in sorted(breakers, key=lambda b: b.name)}
@@ -0,0 +1,149 @@
+"""In-process result caches shared by every session."""
+import json
+import threading
+import time
+
+
+class TTLCache:
+    """Thread-safe TTL cache with tag-based invalidation.
+
+    Entries are stored with a set of tags (e.g. ``"child:<id>"``); a write
+    path calls ``invalidate_tags`` with the tags it touched so readers see
+    fresh data immediately instead of waiting out the TTL.
+
+    With ``stale_ttl``, expired entries are kept that much longer for
+    ``get_stale``, so a reader can fall back to them while the backend is
+    unavailable. Invalidated entries are never served stale.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 1024, max_bytes: int = 0, stale_ttl: float = 0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        # Optional budget on the (JSON-encoded) size of the values held
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> (expires_at, value, tags, size)
+        self._by_tag = {}  # tag -> set of keys
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+
+    def get(self, key):
+        """Return ``(True, value)`` for a live entry, else ``(False, None)``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None and entry[0] + self.stale_ttl <= time.monotonic():
+                    self._drop(key)
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            return True, entry[1]
+
+    def get_stale(self, key):
+        """Like ``get``, but also return an entry expired less than ``stale_ttl`` ago."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] + self.stale_ttl <= time.monotonic():
+                return False, None
+            self.stale_hits += 1
+            return True, entry[1]
+
+    def contains(self, key):
+        """Whether a live entry exists, without counting a hit or miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def set(self, key, value, tags=()):
+        size = _json_size(value) if self.max_bytes else 0
+        with self._lock:
+            self._drop(key)
+            if self.max_bytes and size > self.max_bytes:
+                return
+            # Evict the entries closest to expiry until the new one fits
+            while self._entries and (
+                len(self._entries) >= self.max_entries
+                or (self.max_bytes and self.bytes + size > self.max_bytes)
+            ):
+                self._drop(min(self._entries, key=lambda k: self._entries[k][0]))
+            tags = frozenset(tags)
+            self._entries[key] = (time.monotonic() + self.ttl, value, tags, size)
+            self.bytes += size
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._drop(key)
+
+    def invalidate_tags(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._by_tag.get(tag, ())):
+                    self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_tag.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            stats = {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+            if self.stale_ttl:
+                stats["stale_hits"] = self.stale_hits
+            if self.max_bytes:
+                stats["bytes"] = self.bytes
+            return stats
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.bytes -= entry[3]
+        for tag in entry[2]:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+
+def _json_size(value):
+    return len(json.dumps(value, default=str))
+
+
+RECENT_CASES_TTL = 120
+ROSTER_TTL = 600
+CHILD_SEARCH_TTL = 60
+CASE_TTL = 300
+CASE_CACHE_BYTES = 4 * 1024 * 1024
+# How long past their TTL entries may still be shown while Supabase is down
+STALE_TTL = 3600
+
+
+class AppCaches:
+    """The process-wide caches used by the repos."""
+
+    def __init__(self):
+        # Keyed by (role, user_id); tagged "reporter:", "parent:" and "child:<id>"
+        self.recent_cases = TTLCache(RECENT_CASES_TTL, stale_ttl=STALE_TTL)
+        # Keyed by (user_id, centre_ids); tagged "user:<id>", otherwise expires by TTL
+        self.roster = TTLCache(ROSTER_TTL, stale_ttl=STALE_TTL)
+        # Keyed by (user_id, query, centre_ids, limit); tagged "user:<id>"
+        self.child_search = TTLCache(CHILD_SEARCH_TTL, max_entries=256, stale_ttl=STALE_TTL)
+        # Keyed by (case_id, view, user_id); tagged "case:<id>", "child:" and "reporter:".
+        # Filled by the case screens and the prefetcher, so it is bounded by size
+        self.cases = TTLCache(CASE_TTL, max_bytes=CASE_CACHE_BYTES, stale_ttl=STALE_TTL)
+
+    def stats(self):
+        return {
+            "recent_cases": self.recent_cases.stats(),
+            "roster": self.roster.stats(),
+            "child_search": self.child_search.stats(),
+            "cases": self.cases.stats(),
+        }
@@ -0,0 +1,59 @@
+"""Download the self-hosted Montserrat WOFF2 subsets into static/fonts.
+
+Run once when updating the font, then commit the .woff2 files:
+
+    python fetch_fonts.py
+
+``python fetch_fonts.py --check`` exits non-zero while any subset is
+missing, for use as a release/CI gate: without the files the app falls
+back to Google Fonts and loses offline support and preloading.
+"""
+import os
+import re
+import sys
+
+import httpx
+
+from assets import STATIC_DIR
+
+FAMILY = "Montserrat:wght@400..800"
+SUBSETS = ("latin", "latin-ext")
+CSS_API = "https://fonts.googleapis.com/css2"
+# Google Fonts only serves WOFF2 to browsers it recognises
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+)
+
+_BLOCK = re.compile(r"/\*\s*([\w-]+)\s*\*/\s*@font-face\s*{[^}]*?url\((https://[^)]+\.woff2)\)", re.S)
+
+
+def font_path(subset):
+    return os.path.join(STATIC_DIR, "fonts", f"montserrat-{subset}.woff2")
+
+
+def check():
+    missing = [font_path(subset) for subset in SUBSETS if not os.path.exists(font_path(subset))]
+    for path in missing:
+        print(f"missing: {path}", file=sys.stderr)
+    return 1 if missing else 0
+
+
+def main():
+    if "--check" in sys.argv[1:]:
+        sys.exit(check())
+    with httpx.Client(headers={"User-Agent": USER_AGENT}, timeout=30) as http:
+        css = http.get(CSS_API, params={"family": FAMILY, "display": "swap"})
+        css.raise_for_status()
+        urls = dict(_BLOCK.findall(css.text))
+        for subset in SUBSETS:
+            font = http.get(urls[subset])
+            font.raise_for_status()
+            path = font_path(subset)
+            with open(path, "wb") as f:
+                f.write(font.content)
+            print(f"{path}: {len(font.content)} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""Background AI guidance for new cases.
+
+Opt-in with ``GUIDANCE_CONCURRENCY`` (worker threads; 0 disables it) and
+a ``SUPABASE_SERVICE_KEY``, since the worker reads and writes every
+centre's cases. Each thread leases a batch of up to
+``GUIDANCE_BATCH_SIZE`` pending cases (``claim_guidance_batch``), sends
+the whole batch to the guidance backend in one call, and writes the
+results back in one ``complete_guidance`` call, which moves the cases on
+to ``guided``. A batch that fails is handed straight back to the queue;
+one whose worker died is re-leased when its lease runs out. A case that
+has used its ``GUIDANCE_MAX_ATTEMPTS`` moves to ``guidance_failed``,
+which the case screens show and ``stats()`` counts.
+
+``GUIDANCE_BACKEND`` picks the backend: ``stub`` (the default) is the
+deterministic keyword model below, for local runs and tests; anything
+else is a ``module:attribute`` path to a backend class or factory.
+Backends implement ``generate(cases) -> results``, one result per case
+in order, each with ``ai_recommendation``, ``ai_category``,
+``ai_guidance`` and optionally ``red_flags``.
+
+Run it inside the app (started on first page load) or on its own with
+``python guidance.py``.
+"""
+import importlib
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+GUIDANCE_CONCURRENCY = int(os.getenv("GUIDANCE_CONCURRENCY", "0"))
+GUIDANCE_BATCH_SIZE = int(os.getenv("GUIDANCE_BATCH_SIZE", "8"))
+GUIDANCE_BACKEND = os.getenv("GUIDANCE_BACKEND", "stub")
+GUIDANCE_POLL = float(os.getenv("GUIDANCE_POLL", "5"))
+GUIDANCE_MAX_ATTEMPTS = 3
+GUIDANCE_FAILED = "guidance_failed"  # case status once every attempt has failed
+GUIDANCE_LEASE = 600  # seconds a claimed batch stays with its worker
+THROUGHPUT_WINDOW = 300.0
+
+
+class StubGuidanceBackend:
+    """Deterministic keyword model: same description, same guidance. No network."""
+
+    name = "stub"
+
+    # (keywords, category, recommendation, guidance); the first match wins
+    RULES = (
+        (("breath", "wheez", "choking", "lips blue"), "Respiratory",
+         "Seek medical advice today",
+         "Breathing symptoms should be checked by a GP or nurse today. Keep the child upright and calm."),
+        (("rash", "spots", "hives", "itch"), "Skin",
+         "Monitor and check the rash",
+         "Keep the area clean and note any spread. A rash that does not fade under a pressed glass needs urgent care."),
+        (("fever", "temperature", "hot"), "Fever",
+         "Monitor at home",
+         "Offer fluids and rest, and check the temperature every few hours. See a GP if it lasts more than two days."),
+        (("vomit", "diarrh", "tummy", "stomach", "sick"), "Gastrointestinal",
+         "Monitor at home",
+         "Offer small, frequent sips of fluid. Watch for signs of dehydration such as fewer wet nappies or dry lips."),
+        (("cough", "cold", "runny nose", "sneez", "sore throat"), "Cold & flu",
+         "Monitor at home",
+         "Rest and fluids usually help. See a GP if symptoms get worse or last more than a week."),
+        (("fall", "fell", "bump", "bruise", "cut", "injur"), "Injury",
+         "Check the injury",
+         "Apply a cold compress and watch for swelling, drowsiness or changes in behaviour."),
+    )
+    FALLBACK = ("General", "Monitor at home",
+                "Keep an eye on the symptoms and contact a GP if they get worse or you are worried.")
+
+    def generate(self, cases):
+        return [self._one(case) for case in cases]
+
+    def _one(self, case):
+        text = (case.get("symptom_description") or "").lower()
+        category, recommendation, guidance = next(
+            ((cat, rec, guide) for words, cat, rec, guide in self.RULES if any(w in text for w in words)),
+            self.FALLBACK,
+        )
+        return {"ai_recommendation": recommendation, "ai_category": category, "ai_guidance": guidance}
+
+
+def load_backend(spec=GUIDANCE_BACKEND):
+    """``"stub"`` or a ``module:attribute`` path to a backend class/factory."""
+    if spec == "stub":
+        return StubGuidanceBackend()
+    module, _, attr = spec.partition(":")
+    if not attr:
+        raise ValueError(f"GUIDANCE_BACKEND must be 'stub' or 'module:attribute', got {spec!r}")
+    return getattr(importlib.import_module(module), attr)()
+
+
+class GuidanceWorker:
+    """Pool of threads that drain the guidance queue through one backend."""
+
+    def __init__(self, db, backend, concurrency=GUIDANCE_CONCURRENCY, batch_size=GUIDANCE_BATCH_SIZE,
+                 poll=GUIDANCE_POLL):
+        self.db = db
+        self.backend = backend
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll = poll
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._completed = deque()  # (finished_at, cases) within THROUGHPUT_WINDOW
+        self._started_at = None
+        self._counts = None  # {"queue_depth", "gave_up"}, re-read at most once per poll
+        self._counts_at = 0.0
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+        self.batches = 0
+        self.backend_seconds = 0.0
+
+    def start(self):
+        self._started_at = time.monotonic()
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._loop, name=f"guidance-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def run_once(self):
+        """Claim and process one batch; return the number of cases guided."""
+        cases = self.db.cases.claim_for_guidance(self.batch_size, GUIDANCE_MAX_ATTEMPTS, GUIDANCE_LEASE)
+        if not cases:
+            return 0
+        with self._lock:
+            self.in_flight += len(cases)
+        try:
+            start = time.perf_counter()
+            results = self.backend.generate(cases)
+            elapsed = time.perf_counter() - start
+            if len(results) != len(cases):
+                raise ValueError(f"backend returned {len(results)} results for {len(cases)} cases")
+            self.db.cases.complete_guidance(cases, [_merge(c, r) for c, r in zip(cases, results)])
+        except Exception:
+            logger.exception("guidance batch of %d failed", len(cases))
+            with self._lock:
+                self.failed += len(cases)
+            try:
+                self.db.cases.release_guidance(cases, GUIDANCE_MAX_ATTEMPTS)
+            except Exception:
+                logger.exception("could not release guidance batch; the lease will expire")
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= len(cases)
+        with self._lock:
+            self.processed += len(cases)
+            self.batches += 1
+            self.backend_seconds += elapsed
+            self._completed.append((time.monotonic(), len(cases)))
+        return len(cases)
+
+    def queue_depth(self):
+        """Pending cases, re-counted at most once per poll interval."""
+        return (self._queue_counts() or {}).get("queue_depth")
+
+    def _queue_counts(self):
+        """Pending and given-up case counts, re-read at most once per poll interval."""
+        now = time.monotonic()
+        with self._lock:
+            if self._counts is not None and now - self._counts_at < self.poll:
+                return self._counts
+            self._counts_at = now
+        try:
+            counts = {
+                "queue_depth": self.db.cases.guidance_queue_depth(GUIDANCE_MAX_ATTEMPTS),
+                "gave_up": self.db.cases.guidance_failed_count(),
+            }
+        except Exception:
+            logger.exception("guidance queue counts unavailable")
+            return self._counts
+        with self._lock:
+            self._counts = counts
+        return counts
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._completed and now - self._completed[0][0] > THROUGHPUT_WINDOW:
+                self._completed.popleft()
+            window = min(THROUGHPUT_WINDOW, now - self._started_at) if self._started_at else 0
+            recent = sum(n for _, n in self._completed)
+            stats = {
+                "backend": getattr(self.backend, "name", type(self.backend).__name__),
+                "concurrency": self.concurrency,
+                "batch_size": self.batch_size,
+                "in_flight": self.in_flight,
+                "processed": self.processed,
+                "failed": self.failed,
+                "batches": self.batches,
+                "per_minute": round(recent / window * 60, 1) if window else 0.0,
+                "avg_batch_ms": round(self.backend_seconds / self.batches * 1000, 1) if self.batches else None,
+            }
+        stats.update(self._queue_counts() or {"queue_depth": None, "gave_up": None})
+        return stats
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                guided = self.run_once()
+            except Exception:
+                guided = 0
+                self._stop.wait(self.poll)  # back off after a failed batch
+                continue
+            # A full batch means more are probably waiting
+            if guided < self.batch_size:
+                self._stop.wait(self.poll)
+
+
+def _merge(case, result):
+    """The row written back: the backend's fields, red flags unioned with the case's own."""
+    flags = list(dict.fromkeys((case.get("red_flags") or []) + list(result.get("red_flags") or [])))
+    return {
+        "id": case["id"],
+        "ai_recommendation": result.get("ai_recommendation"),
+        "ai_category": result.get("ai_category"),
+        "ai_guidance": result.get("ai_guidance"),
+        "red_flags": flags,
+    }
+
+
+def main():
+    from dotenv import load_dotenv
+
+    from cache import AppCaches
+    from repos import Db, QueryStats
+    from supabase_pool import SupabasePool
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    pool = SupabasePool(os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"])
+    client = pool.session_client()
+    client.bind(os.environ["SUPABASE_SERVICE_KEY"])
+    worker = GuidanceWorker(Db(client, QueryStats(), AppCaches()), load_backend(),
+                            concurrency=max(GUIDANCE_CONCURRENCY, 1)).start()
+    try:
+        while True:
+            time.sleep(60)
+            logger.info("guidance: %s", worker.stats())
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Photo preprocessing before upload to Supabase Storage.
+
+Applies the EXIF orientation, drops all metadata (EXIF/GPS, ICC, XMP),
+downsizes to a maximum edge and re-encodes at a target quality. Square
+thumbnail variants for the Recent Cases list are cut from the same
+decoded image.
+"""
+import io
+import logging
+import math
+import os
+from contextlib import nullcontext
+from dataclasses import dataclass
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+PHOTO_MAX_EDGE = int(os.getenv("PHOTO_MAX_EDGE", "1600"))
+PHOTO_FORMAT = os.getenv("PHOTO_FORMAT", "JPEG").upper()  # JPEG or WEBP
+PHOTO_QUALITY = int(os.getenv("PHOTO_QUALITY", "82"))
+THUMB_SIZES = (128, 256)
+
+_FORMATS = {
+    "JPEG": ("image/jpeg", "jpg"),
+    "WEBP": ("image/webp", "webp"),
+}
+
+
+@dataclass
+class ProcessedImage:
+    data: bytes
+    content_type: str
+    extension: str
+    original_size: int
+    thumbnails: dict  # edge in px -> encoded bytes
+
+    @property
+    def bytes_saved(self):
+        return self.original_size - len(self.data)
+
+    @property
+    def total_size(self):
+        return len(self.data) + sum(len(t) for t in self.thumbnails.values())
+
+
+def preprocess(source, max_edge=PHOTO_MAX_EDGE, fmt=PHOTO_FORMAT, quality=PHOTO_QUALITY,
+               thumb_sizes=THUMB_SIZES, reserve=None):
+    """Return a re-encoded, metadata-free copy of the image in ``source``.
+
+    ``source`` is bytes or a seekable binary file. ``reserve(nbytes)``, if
+    given, is entered around decoding with ``peak_bytes`` of the image so
+    the caller can bound memory across concurrent uploads (and refuse
+    images that could never fit).
+    """
+    if isinstance(source, (bytes, bytearray)):
+        original_size = len(source)
+        source = io.BytesIO(source)
+    else:
+        original_size = source.seek(0, io.SEEK_END)
+        source.seek(0)
+
+    content_type, extension = _FORMATS[fmt]
+    with Image.open(source) as original:
+        # JPEG decodes at 1/2..1/8 scale when both sides still cover the
+        # requested size, so ask for the aspect-scaled size (not a max_edge
+        # square): a 12MP phone photo then decodes at 2016x1512
+        scale = max_edge / max(original.size)
+        if scale < 1:
+            original.draft("RGB", (math.ceil(original.width * scale), math.ceil(original.height * scale)))
+        peak = peak_bytes(original.size, original.mode, max_edge, thumb_sizes)
+        with reserve(peak) if reserve else nullcontext():
+            img = ImageOps.exif_transpose(original)
+            original.close()  # only the transposed copy is used from here on
+            img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+            out = encode(img, fmt, quality)
+            thumbs = {
+                size: encode(ImageOps.fit(img, (size, size), Image.Resampling.LANCZOS), fmt, quality)
+                for size in thumb_sizes
+            }
+
+    processed = ProcessedImage(out, content_type, extension, original_size, thumbs)
+    logger.info(
+        "photo preprocessed: %d -> %d bytes (%d saved)",
+        processed.original_size, len(processed.data), processed.bytes_saved,
+    )
+    return processed
+
+
+def peak_bytes(size, mode, max_edge=PHOTO_MAX_EDGE, thumb_sizes=THUMB_SIZES):
+    """Upper bound on the pixel memory ``preprocess`` holds at once.
+
+    ``size`` and ``mode`` are those of the image as it will be decoded.
+    Processing goes through three stages, and the peak is the largest:
+    the decoded source and its ``exif_transpose`` copy; that copy and its
+    resized version; the resized image with the RGB conversion and the
+    metadata-free copy ``encode`` makes, plus the thumbnails cut the same
+    way. Pillow keeps multi-band pixels in 4 bytes.
+    """
+    width, height = size
+    source = width * height * (1 if mode in ("1", "L", "P") else 4)
+    scale = min(1.0, max_edge / max(width, height))
+    resized = math.ceil(width * scale) * math.ceil(height * scale) * 4
+    thumbs = sum(3 * edge * edge * 4 for edge in thumb_sizes)
+    return max(2 * source, source + resized, 3 * resized + thumbs)
+
+
+def encode(img, fmt=PHOTO_FORMAT, quality=PHOTO_QUALITY):
+    """Encode ``img`` without any metadata."""
+    if fmt == "JPEG":
+        img = _flatten(img)
+    elif img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+
+    # Copy pixels only, so no EXIF/ICC/XMP from the source survives
+    clean = Image.new(img.mode, img.size)
+    clean.paste(img)
+
+    buf = io.BytesIO()
+    if fmt == "JPEG":
+        clean.save(buf, "JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        clean.save(buf, "WEBP", quality=quality, method=4)
+    return buf.getvalue()
+
+
+def _flatten(img):
+    """JPEG has no alpha: composite transparent images onto white."""
+    if img.mode in ("RGBA", "LA") or "transparency" in img.info:
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    return img.convert("RGB")
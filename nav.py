@@ -0,0 +1,59 @@
+"""Header bar, back navigation and realtime case updates as declared components.
+
+The nav component (``frontend/nav``) draws the bell, avatar, logout
+button and the optional "‹ Title" back link, and returns clicks to
+Python as its value. It keeps a single key on every screen, so the
+iframe is loaded once per session and only receives new args on reruns.
+
+Because it lives for the whole session, the nav iframe also holds the
+Supabase Realtime socket: it keeps the bell's unread count itself and
+relays each change on ``cases`` over a per-session ``BroadcastChannel``
+to the invisible ``live_changes`` listener (``frontend/live``), which
+sits inside the list fragment so only that region reruns.
+"""
+import os
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+_FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend")
+_nav = components.declare_component("app_nav", path=os.path.join(_FRONTEND_DIR, "nav"))
+_live = components.declare_component("live_changes", path=os.path.join(_FRONTEND_DIR, "live"))
+
+
+def app_nav(initial, back_label=None, font_css=None, realtime=None, pending=0, seen_ids=(),
+            key="app_nav"):
+    """Render the nav; return ``"logout"``/``"back"``/``"bell"`` once per click, else None.
+
+    ``font_css`` is the page's font stylesheet URL, so the iframe reuses
+    the same (already cached) font files instead of fetching its own.
+    ``realtime`` holds the socket settings (``url``, ``apikey``,
+    ``access_token``, ``channel``, ``role``, ``user_id``), or None when
+    signed out. The bell shows the ``pending`` count plus cases changed
+    since this render, less ``seen_ids``.
+    """
+    event = _nav(
+        initial=initial,
+        back_label=back_label,
+        font_css=font_css,
+        realtime=realtime,
+        pending=pending,
+        seen_ids=list(seen_ids),
+        key=key,
+        default=None,
+    )
+    return _new_event(event, key).get("action")
+
+
+def live_changes(channel, key="live_changes"):
+    """Case changes pushed since the last call, as a list of row dicts."""
+    event = _live(channel=channel, key=key, default=None)
+    return _new_event(event, key).get("changes", [])
+
+
+def _new_event(event, key):
+    # The last value is replayed on every rerun until the next event
+    if not event or event.get("id") == st.session_state.get(f"{key}_handled"):
+        return {}
+    st.session_state[f"{key}_handled"] = event["id"]
+    return event
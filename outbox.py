@@ -0,0 +1,374 @@
+"""Durable local write-ahead queue for case writes.
+
+Submissions, acknowledgements and photo attachments are committed to a
+local SQLite database (WAL, synchronous=FULL) before anything is sent
+to Supabase, so Submit returns at once and nothing typed is lost when
+Supabase is slow or down. A background flusher delivers due entries in
+order, batching consecutive inserts (and acknowledgements) per user
+into one request, and retries with exponential backoff.
+
+Every entry carries an idempotency key. Cases are inserted with a
+client-generated primary key and ``ON CONFLICT DO NOTHING``, and
+acknowledgements and photo patches are plain idempotent updates, so a
+batch that was applied but whose response was lost can be resent safely.
+
+Errors that will not go away on retry mark the entry ``failed``. It is
+kept, and later entries for the same case are held behind it, until the
+user retries or discards it from the case list.
+
+Writes go out under the user's own session (RLS applies): a session
+registers its ``Db`` and ``SessionManager`` per user, and the flusher
+refreshes an expired token through the manager, so entries are still
+delivered after the tab is closed. A session is dropped once Auth
+rejects its refresh token, or once its token has expired with nothing
+left to send. Entries for users with no session (after sign-out or a
+restart) wait until they sign in again.
+"""
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from postgrest.exceptions import APIError
+
+from auth_session import AuthSessionError, AuthUnavailableError, jwt_expiry
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "data/outbox.sqlite3")
+FLUSH_SCAN = 500
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 300.0
+IDLE_WAIT = 30.0
+
+INSERT_CASE = "insert_case"
+ACKNOWLEDGE = "acknowledge"
+ATTACH_PHOTO = "attach_photo"
+
+# Postgres error classes that will fail the same way on every retry:
+# data exceptions, integrity violations, syntax/permission errors
+_PERMANENT_SQLSTATE_CLASSES = ("22", "23", "42")
+
+_NOT_HELD = (
+    "json_extract(payload, '$.id') not in "
+    "(select json_extract(f.payload, '$.id') from outbox f where f.status = 'failed')"
+)
+
+_SCHEMA = """
+create table if not exists outbox (
+    id integer primary key autoincrement,
+    idem_key text not null unique,
+    kind text not null,
+    user_id text not null,
+    payload text not null,
+    meta text not null default '{}',
+    status text not null default 'pending',
+    attempts integer not null default 0,
+    next_attempt_at real not null default 0,
+    last_error text,
+    created_at real not null
+);
+create index if not exists outbox_due_idx on outbox (status, next_attempt_at, id);
+"""
+
+
+def is_retriable(exc):
+    if isinstance(exc, APIError):
+        return str(exc.code or "")[:2] not in _PERMANENT_SQLSTATE_CLASSES
+    return True  # transport errors, timeouts, expired JWTs, anything unknown
+
+
+def backoff_delay(attempts):
+    """Exponential backoff with full jitter, capped at BACKOFF_MAX."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempts))
+
+
+class Outbox:
+    """Process-wide SQLite write-ahead queue with a background flusher."""
+
+    def __init__(self, path=OUTBOX_PATH, flusher=True):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.execute("pragma synchronous=full")
+        self._conn.executescript(_SCHEMA)
+        self._sessions = {}  # user_id -> (Db, SessionManager or None)
+        self._wake = threading.Event()
+        self.delivered = 0
+        # flusher=False leaves delivery to explicit flush() calls (tests)
+        if flusher:
+            threading.Thread(target=self._flush_forever, name="outbox-flusher", daemon=True).start()
+
+    # ── Sessions ──
+    def register(self, user_id, db, auth=None):
+        """Let the flusher send ``user_id``'s entries through ``db``, refreshing via ``auth``."""
+        with self._lock:
+            known = self._sessions.get(user_id, (None,))[0] is db
+            self._sessions[user_id] = (db, auth)
+        if not known:
+            self._wake.set()
+
+    def unregister(self, user_id, db):
+        with self._lock:
+            if self._sessions.get(user_id, (None,))[0] is db:
+                del self._sessions[user_id]
+
+    # ── Enqueue ──
+    def enqueue(self, kind, user_id, payload, idem_key, meta=None):
+        """Commit one write durably and wake the flusher; duplicates are ignored."""
+        self.enqueue_many(kind, user_id, [(payload, idem_key, meta)])
+
+    def enqueue_many(self, kind, user_id, entries):
+        """Commit ``(payload, idem_key, meta)`` entries in one transaction.
+
+        The flusher is woken once, after the commit, so it sees (and
+        batches) all of them together.
+        """
+        now = time.time()
+        rows = [
+            (idem_key, kind, user_id, json.dumps(payload), json.dumps(meta or {}), now)
+            for payload, idem_key, meta in entries
+        ]
+        with self._lock:
+            self._conn.execute("begin")
+            try:
+                # A duplicate of a pending entry is ignored; one of a failed
+                # entry (e.g. acknowledging the case again) retries it
+                self._conn.executemany(
+                    "insert into outbox (idem_key, kind, user_id, payload, meta, created_at) "
+                    "values (?, ?, ?, ?, ?, ?) "
+                    "on conflict (idem_key) do update set status = 'pending', attempts = 0, "
+                    "next_attempt_at = 0, last_error = null where outbox.status = 'failed'",
+                    rows,
+                )
+            except BaseException:
+                self._conn.execute("rollback")
+                raise
+            self._conn.execute("commit")
+        self._wake.set()
+
+    def enqueue_case(self, user_id, case_data, parent_ids=(), child_name=""):
+        """Queue a case insert; ``case_data["id"]`` is the idempotency key."""
+        self.enqueue(
+            INSERT_CASE,
+            user_id,
+            case_data,
+            f"{INSERT_CASE}:{case_data['id']}",
+            {"parent_ids": list(parent_ids or ()), "child_name": child_name},
+        )
+
+    def enqueue_acknowledge(self, user_id, case_ids):
+        self.enqueue_many(
+            ACKNOWLEDGE,
+            user_id,
+            [({"id": case_id}, f"{ACKNOWLEDGE}:{case_id}", None) for case_id in dict.fromkeys(case_ids)],
+        )
+
+    def enqueue_photo(self, db, user_id, case_id, fields):
+        """``PhotoUploader`` attach hook: the patch is queued behind the case insert."""
+        self.enqueue(ATTACH_PHOTO, user_id, {"id": case_id, **fields}, f"{ATTACH_PHOTO}:{case_id}")
+
+    # ── Reads for the UI ──
+    def pending(self, user_id):
+        """Undelivered (pending or failed) entries for ``user_id``, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "select kind, payload, meta, status from outbox where user_id = ? order by id", (user_id,)
+            ).fetchall()
+        return [
+            {"kind": r["kind"], "payload": json.loads(r["payload"]), "meta": json.loads(r["meta"]), "status": r["status"]}
+            for r in rows
+        ]
+
+    # ── Failed entries ──
+    def retry(self, user_id, case_id):
+        """Queue ``case_id``'s failed entries for delivery again."""
+        with self._lock:
+            self._conn.execute(
+                "update outbox set status = 'pending', attempts = 0, next_attempt_at = 0, last_error = null "
+                "where user_id = ? and status = 'failed' and json_extract(payload, '$.id') = ?",
+                (user_id, case_id),
+            )
+        self._wake.set()
+
+    def discard(self, user_id, case_id):
+        """Drop every undelivered entry for ``case_id``, including those held behind a failure."""
+        with self._lock:
+            self._conn.execute(
+                "delete from outbox where user_id = ? and json_extract(payload, '$.id') = ?", (user_id, case_id)
+            )
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._conn.execute("select status, count(*) from outbox group by status").fetchall())
+            oldest = self._conn.execute(
+                "select min(created_at) from outbox where status = 'pending'"
+            ).fetchone()[0]
+            sessions = len(self._sessions)
+        return {
+            "pending": counts.get("pending", 0),
+            "failed": counts.get("failed", 0),
+            "delivered": self.delivered,
+            "oldest_pending_s": round(time.time() - oldest, 1) if oldest else None,
+            "sessions": sessions,
+        }
+
+    # ── Flusher ──
+    def _flush_forever(self):
+        while True:
+            self._wake.clear()
+            try:
+                wait = self.flush()
+            except Exception:
+                logger.exception("outbox flush failed")
+                wait = IDLE_WAIT
+            self._wake.wait(wait)
+
+    def flush(self):
+        """Deliver due entries once; return seconds until the next one is due."""
+        now = time.time()
+        with self._lock:
+            # Entries for a case with a failed entry are held until it is
+            # retried or discarded, so a photo patch never lands on a case
+            # whose insert failed
+            rows = self._conn.execute(
+                f"select * from outbox where status = 'pending' and {_NOT_HELD} order by id limit ?",
+                (FLUSH_SCAN,),
+            ).fetchall()
+            registered = dict(self._sessions)
+        sessions = self._usable_sessions(registered, {r["user_id"] for r in rows}, now)
+
+        # Keep each user's writes in order: once one of their batches is
+        # held back (backing off, or no live session), nothing after it is
+        # sent, so a photo patch never overtakes its case insert
+        blocked = set()
+        for batch in _batches(rows):
+            user_id = batch[0]["user_id"]
+            db = sessions.get(user_id)
+            if user_id in blocked or db is None or batch[0]["next_attempt_at"] > now:
+                blocked.add(user_id)
+                continue
+            try:
+                if not self._deliver(db, batch):
+                    blocked.add(user_id)
+            except Exception:
+                blocked.add(user_id)
+
+        # Users without a live session are woken by register(), not by time
+        with self._lock:
+            due = self._conn.execute(
+                f"select user_id, min(next_attempt_at) from outbox where status = 'pending' and {_NOT_HELD} "
+                "group by user_id"
+            ).fetchall()
+        next_due = min((at for user_id, at in due if user_id in sessions), default=None)
+        if next_due is None:
+            return IDLE_WAIT
+        return min(IDLE_WAIT, max(next_due - time.time(), 0.05))
+
+    def _usable_sessions(self, registered, users, now):
+        """The registered sessions that can send now, pruning dead ones.
+
+        Only users with entries to send get an expired token refreshed.
+        A session without a token would send as anon.
+        """
+        sessions = {}
+        for user_id, (db, auth) in registered.items():
+            if auth is not None and user_id in users:
+                try:
+                    auth.ensure_valid(touch=False)
+                except AuthUnavailableError:
+                    continue  # keep the session; try again on a later pass
+                except AuthSessionError:
+                    self.unregister(user_id, db)
+                    continue
+            token = db.client.access_token
+            exp = jwt_expiry(token)
+            if token is None or (user_id not in users and exp is not None and exp <= now):
+                self.unregister(user_id, db)
+            elif user_id in users:
+                sessions[user_id] = db
+        return sessions
+
+    def _deliver(self, db, batch):
+        """Send ``batch`` and delete it; return whether all of it was delivered.
+
+        A permanent error fails the whole request even when one row is at
+        fault, so the batch is bisected until only the bad rows are marked
+        failed. A retriable error is recorded and re-raised, leaving the
+        rest of the batch unsent.
+        """
+        try:
+            self._send(db, batch)
+        except Exception as e:
+            if is_retriable(e):
+                self._record_failure(batch, e)
+                raise
+            if len(batch) == 1:
+                self._record_failure(batch, e)
+                return False
+            mid = len(batch) // 2
+            first = self._deliver(db, batch[:mid])
+            return self._deliver(db, batch[mid:]) and first
+        with self._lock:
+            self._conn.executemany("delete from outbox where id = ?", [(r["id"],) for r in batch])
+            self.delivered += len(batch)
+        return True
+
+    def _send(self, db, batch):
+        kind = batch[0]["kind"]
+        payloads = [json.loads(r["payload"]) for r in batch]
+        if kind == INSERT_CASE:
+            parent_ids = {pid for r in batch for pid in json.loads(r["meta"]).get("parent_ids", [])}
+            db.cases.insert_many(payloads, parent_ids)
+        elif kind == ACKNOWLEDGE:
+            db.cases.acknowledge_many([p["id"] for p in payloads], parent_id=batch[0]["user_id"])
+        elif kind == ATTACH_PHOTO:
+            (payload,) = payloads
+            db.cases.attach_photo(payload.pop("id"), payload)
+        else:
+            raise ValueError(f"unknown outbox entry kind {kind!r}")
+
+    def _record_failure(self, batch, exc):
+        retriable = is_retriable(exc)
+        attempts = batch[0]["attempts"] + 1
+        if retriable:
+            logger.warning("outbox %s x%d failed (attempt %d), will retry: %s", batch[0]["kind"], len(batch), attempts, exc)
+        else:
+            logger.error("outbox %s x%d failed permanently: %s", batch[0]["kind"], len(batch), exc)
+        with self._lock:
+            self._conn.executemany(
+                "update outbox set attempts = ?, next_attempt_at = ?, last_error = ?, status = ? where id = ?",
+                [
+                    (
+                        attempts,
+                        time.time() + backoff_delay(attempts),
+                        str(exc)[:500],
+                        "pending" if retriable else "failed",
+                        r["id"],
+                    )
+                    for r in batch
+                ],
+            )
+
+
+def _batches(rows):
+    """Group consecutive rows with the same user and kind; photo patches go one by one."""
+    batches = []
+    for row in rows:
+        last = batches[-1] if batches else None
+        if (
+            last
+            and row["kind"] != ATTACH_PHOTO
+            and last[0]["kind"] == row["kind"]
+            and last[0]["user_id"] == row["user_id"]
+        ):
+            last.append(row)
+        else:
+            batches.append([row])
+    return batches
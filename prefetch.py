@@ -0,0 +1,76 @@
+"""Background prefetch of case details for the Recent Cases list.
+
+Opt-in with ``CASE_PREFETCH_COUNT`` (the number of top visible cases to
+load; 0 disables it). After the home list renders, the detail records
+for those cases are loaded in one batched query off the script thread
+and land in the shared case cache, so tapping "View" opens without a
+network wait.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+CASE_PREFETCH_COUNT = int(os.getenv("CASE_PREFETCH_COUNT", "0"))
+PREFETCH_WORKERS = 2
+
+
+class CasePrefetcher:
+    """Process-wide worker pool that warms ``AppCaches.cases``."""
+
+    def __init__(self, count=CASE_PREFETCH_COUNT, max_workers=PREFETCH_WORKERS):
+        self.count = count
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="case-prefetch")
+        self._lock = threading.Lock()
+        self._in_flight = set()  # (case_id, view, user_id)
+        self.batches = 0
+        self.rows = 0
+        self.failed = 0
+
+    @property
+    def enabled(self):
+        return self.count > 0
+
+    def submit(self, db, case_ids, view, user_id):
+        """Queue the first ``count`` of ``case_ids`` unless cached or already queued."""
+        if not self.enabled:
+            return None
+        cache = db.caches.cases
+        with self._lock:
+            keys = [
+                (cid, view, user_id)
+                for cid in list(dict.fromkeys(case_ids))[: self.count]
+                if (cid, view, user_id) not in self._in_flight and not cache.contains((cid, view, user_id))
+            ]
+            if not keys:
+                return None
+            self._in_flight.update(keys)
+        return self._executor.submit(self._run, db, keys)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "count": self.count,
+                "in_flight": len(self._in_flight),
+                "batches": self.batches,
+                "rows": self.rows,
+                "failed": self.failed,
+            }
+
+    def _run(self, db, keys):
+        _, view, user_id = keys[0]
+        try:
+            rows = db.cases.prefetch([cid for cid, _, _ in keys], view, user_id)
+        except Exception:
+            logger.exception("case prefetch failed")
+            with self._lock:
+                self.failed += 1
+            return
+        finally:
+            with self._lock:
+                self._in_flight.difference_update(keys)
+        with self._lock:
+            self.batches += 1
+            self.rows += rows
@@ -0,0 +1,161 @@
+"""Red-flag detection on symptom descriptions, run at submit time.
+
+A single Aho-Corasick automaton over every phrase of the lexicon scans
+a description in one pass, so the case is flagged before it is queued,
+without waiting for the guidance model. The lexicon maps each flag (as
+shown on the case screen) to its trigger phrases; ``RED_FLAG_LEXICON``
+points at a JSON file of the same shape to replace the built-in one.
+
+Matches must sit on word boundaries. A match is dropped when a negation
+cue ("no", "not", "without", "denies", "...n't") occurs within
+``NEGATION_WINDOW`` words before it in the same clause; clauses end at
+punctuation and at "but", "and" or "however". That keeps "no rash and
+struggling to breathe" flagged. A cue that governs a verb such as
+"stop" or "help", or that expresses doubt ("not sure", "can't tell"),
+does not negate what follows: "can't stop vomiting blood" is flagged.
+Anything ambiguous is flagged rather than negated.
+"""
+import json
+import os
+import re
+from collections import deque
+
+RED_FLAG_LEXICON = os.getenv("RED_FLAG_LEXICON")
+NEGATION_WINDOW = 4
+
+DEFAULT_LEXICON = {
+    "Difficulty breathing": [
+        "difficulty breathing", "trouble breathing", "struggling to breathe", "laboured breathing",
+        "labored breathing", "gasping", "not breathing", "stopped breathing",
+    ],
+    "Blue lips or skin": ["blue lips", "lips blue", "lips turning blue", "turning blue", "bluish"],
+    "Choking": ["choking", "choked"],
+    "Non-blanching rash": [
+        "non-blanching rash", "non blanching rash", "rash does not fade", "rash doesn't fade",
+        "purple rash", "purple spots",
+    ],
+    "Seizure": ["seizure", "seizures", "convulsion", "convulsions", "convulsing", "having a fit", "febrile fit"],
+    "Unresponsive or hard to wake": [
+        "unresponsive", "hard to wake", "difficult to wake", "won't wake", "floppy", "unconscious",
+        "passed out", "fainted",
+    ],
+    "Stiff neck": ["stiff neck", "neck stiffness", "neck is stiff"],
+    "Severe allergic reaction": [
+        "anaphylaxis", "anaphylactic", "swollen lips", "swollen tongue", "face swelling",
+        "swelling of the face", "throat swelling", "epipen",
+    ],
+    "Head injury": [
+        "head injury", "hit head", "hit his head", "hit her head", "hit their head", "bumped head",
+        "bumped his head", "bumped her head", "banged head", "banged his head", "banged her head",
+    ],
+    "Signs of dehydration": [
+        "no wet nappies", "no wet nappy", "not drinking", "refusing fluids", "refusing to drink",
+        "sunken eyes",
+    ],
+    "Blood in vomit or stool": [
+        "vomiting blood", "blood in vomit", "blood in stool", "blood in poo", "bloody diarrhoea",
+        "bloody diarrhea",
+    ],
+    "Very high temperature": ["very high temperature", "very high fever", "high fever"],
+}
+
+_NEGATIONS = frozenset({"no", "not", "without", "never", "nor", "denies", "denied", "none", "negative"})
+# Words after a negation cue that take it away from the symptom that follows
+_SCOPE_BREAKERS = frozenset({
+    "stop", "stops", "stopped", "stopping", "quit", "help", "keep", "kept", "sure", "certain", "tell", "know",
+})
+_CLAUSE_BREAK = re.compile(r"[.;:!?,\n]|\b(?:but|and|however|although|though)\b")
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def _normalize(text):
+    return " ".join(text.lower().replace("’", "'").split())
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == "'"
+
+
+class RedFlagDetector:
+    """Aho-Corasick matcher from phrases to red-flag labels."""
+
+    def __init__(self, lexicon):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]  # node -> [(phrase_length, label)]
+        for label, phrases in lexicon.items():
+            for phrase in phrases:
+                self._add(_normalize(phrase), label)
+        self._link()
+
+    @classmethod
+    def from_config(cls, path=RED_FLAG_LEXICON):
+        if not path:
+            return cls(DEFAULT_LEXICON)
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _add(self, phrase, label):
+        if not phrase:
+            return
+        node = 0
+        for ch in phrase:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = self._goto[node][ch] = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(phrase), label))
+
+    def _link(self):
+        # Breadth-first failure links; each node also reports its suffix matches
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                # Depth-1 nodes would otherwise link to themselves
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def matches(self, text):
+        """Yield ``(start, end, label)`` for every word-bounded phrase in normalised ``text``."""
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for length, label in self._out[node]:
+                start, end = i + 1 - length, i + 1
+                if (start == 0 or not _is_word_char(text[start - 1])) and (
+                    end == len(text) or not _is_word_char(text[end])
+                ):
+                    yield start, end, label
+
+    def scan(self, text):
+        """Red-flag labels found in ``text``, in order of first mention, negated mentions skipped."""
+        text = _normalize(text or "")
+        flags = {}
+        for start, _, label in self.matches(text):
+            if label not in flags and not _negated(text, start):
+                flags[label] = None
+        return list(flags)
+
+
+def _negated(text, start):
+    """Whether a negation cue precedes ``start`` closely, within the same clause."""
+    before = text[max(0, start - 120):start]
+    breaks = list(_CLAUSE_BREAK.finditer(before))
+    clause = before[breaks[-1].end():] if breaks else before
+    words = _WORD.findall(clause)[-NEGATION_WINDOW:]
+    cues = [i for i, w in enumerate(words) if w in _NEGATIONS or w.endswith("n't")]
+    if not cues:
+        return False
+    # The cue nearest the match decides; it negates only if nothing between them redirects it
+    return not any(w in _SCOPE_BREAKERS for w in words[cues[-1] + 1:])
@@ -0,0 +1,511 @@
+"""Data-access layer for the Be Well screens.
+
+Every query the app makes goes through a repo method here, so this is
+the single place to tune columns, add caching and measure round trips.
+Within one Streamlit rerun, identical reads are coalesced into a single
+request.
+"""
+import threading
+import time
+from concurrent.futures import Future
+
+from breaker import READ_BUDGET, WRITE_BUDGET, is_backend_failure
+
+CASE_LIST_COLUMNS = (
+    "id, child_id, symptom_date, symptom_description, status, created_at, "
+    "photo_url, thumb_url, thumb_url_2x"
+)
+# Columns each case screen renders; the child's name is embedded alongside
+CASE_VIEW_COLUMNS = {
+    "details": (
+        "id, child_id, reported_by, created_at, symptom_description, photo_url, "
+        "status, ai_recommendation, ai_category, ai_guidance, red_flags"
+    ),
+    "acknowledge": "id, child_id, reported_by, created_at, status, symptom_description, ai_guidance, red_flags",
+}
+PAGE_SIZE = 20
+SEARCH_LIMIT = 20
+
+
+class QueryStats:
+    """Process-wide per-(table, operation) query counts and latency."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, table, op, elapsed):
+        with self._lock:
+            count, total = self._stats.get((table, op), (0, 0.0))
+            self._stats[(table, op)] = (count + 1, total + elapsed)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                f"{table}.{op}": {"count": count, "avg_ms": round(total / count * 1000, 1)}
+                for (table, op), (count, total) in sorted(self._stats.items())
+            }
+
+
+class Coalescer:
+    """Shares one result between identical reads issued in the same rerun."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures = {}
+
+    def clear(self):
+        with self._lock:
+            self._futures = {}
+
+    def read(self, key, fetch):
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+        if owner:
+            try:
+                future.set_result(fetch())
+            except Exception as e:
+                with self._lock:
+                    self._futures.pop(key, None)
+                future.set_exception(e)
+        return future.result()
+
+
+class Db:
+    """Per-session entry point bundling the repos over one session client."""
+
+    def __init__(self, client, stats: QueryStats, caches):
+        self.client = client
+        self.stats = stats
+        self.caches = caches
+        self.loader = Coalescer()
+        self.cases = CasesRepo(self)
+        self.children = ChildrenRepo(self)
+        self.users = UsersRepo(self)
+        self.counters = CountersRepo(self)
+        # Tables read from stale cache entries this rerun (backend unavailable);
+        # repos add to it from the prefetch and outbox threads too
+        self._stale_lock = threading.Lock()
+        self._stale = set()
+
+    def begin_rerun(self):
+        """Drop per-rerun results so each rerun sees fresh data."""
+        self.loader.clear()
+        with self._stale_lock:
+            self._stale.clear()
+
+    def begin_fragment(self):
+        """Drop coalesced results at the start of a fragment run.
+
+        A fragment rerun does not rerun the script, so without this it
+        would keep reading results (and re-caching them with a fresh TTL)
+        memoised by the full run that preceded it.
+        """
+        self.loader.clear()
+
+    def mark_stale(self, table):
+        with self._stale_lock:
+            self._stale.add(table)
+
+    def take_stale(self, table):
+        """Whether ``table`` was served stale since last asked; clears the mark."""
+        with self._stale_lock:
+            if table not in self._stale:
+                return False
+            self._stale.discard(table)
+            return True
+
+    def execute(self, table, op, query, write=False):
+        """Run ``query`` behind ``table``'s circuit breaker, within its latency budget.
+
+        postgrest's own retry (sleeping and resending GET/HEAD on 503/520)
+        is turned off: it would run past the budget, and the breaker and
+        the outbox already decide when to try again.
+        """
+        start = time.perf_counter()
+        query = query.retry(False)
+        try:
+            return self.client.breakers.call(table, query.execute, WRITE_BUDGET if write else READ_BUDGET)
+        finally:
+            self.stats.record(table, op, time.perf_counter() - start)
+
+
+class _Repo:
+    table = ""
+
+    def __init__(self, db: Db):
+        self.db = db
+
+    def _query(self):
+        return self.db.client.table(self.table)
+
+    def _read(self, op, args, build):
+        """Coalesced read returning ``response.data`` (None for no row)."""
+        def fetch():
+            res = self.db.execute(self.table, op, build())
+            return res.data if res is not None else None
+
+        return self.db.loader.read((self.table, op, args), fetch)
+
+    def _stale(self, cache, key, exc):
+        """Serve an expired cache entry when ``exc`` means the backend is down, else re-raise."""
+        if is_backend_failure(exc):
+            hit, value = cache.get_stale(key)
+            if hit:
+                self.db.mark_stale(self.table)
+                return value
+        raise exc
+
+
+class UsersRepo(_Repo):
+    table = "users"
+
+    def get_profile(self, user_id):
+        return self._read(
+            "profile",
+            (user_id,),
+            lambda: self._query().select("display_name, role, centre_ids").eq("id", user_id).maybe_single(),
+        )
+
+
+class CountersRepo(_Repo):
+    table = "user_case_counters"
+
+    def pending_count(self, user_id):
+        """Cases awaiting acknowledgement for ``user_id``: one primary-key read.
+
+        ``user_case_counters`` is kept current by a trigger on ``cases``
+        (parents count their children's cases, carers their own reports).
+        """
+        row = self._read(
+            "pending_count",
+            (user_id,),
+            lambda: self._query().select("pending_ack").eq("user_id", user_id).maybe_single(),
+        )
+        return row["pending_ack"] if row else 0
+
+
+class ChildrenRepo(_Repo):
+    table = "children"
+
+    def roster(self, user_id, centre_ids):
+        """The user's own and recently reported children, each with a ``label``.
+
+        One ``child_roster`` RPC returns them with "Parent - Child" labels
+        resolved, most recently reported first; other children are reached
+        through ``search``. Results are cached per user. The app never
+        writes children (they are managed outside it), so a change there
+        shows once ``ROSTER_TTL`` runs out; a case insert drops the
+        reporter's roster at once, since it reorders their recent children.
+        """
+        key = (user_id, tuple(sorted(centre_ids)))
+        cache = self.db.caches.roster
+        hit, rows = cache.get(key)
+        if hit:
+            return rows
+
+        try:
+            rows = self._read(
+                "roster",
+                key,
+                lambda: self.db.client.rpc("child_roster", {"p_user_id": user_id, "p_centre_ids": list(centre_ids)}),
+            ) or []
+        except Exception as e:
+            return self._stale(cache, key, e)
+        cache.set(key, rows, {f"user:{user_id}"})
+        return rows
+
+    def search(self, query, user_id, centre_ids, limit=SEARCH_LIMIT):
+        """Top ``limit`` children whose name starts with or resembles ``query``.
+
+        Runs the ``search_children`` RPC (prefix + trigram index) scoped to
+        the user's centres. The RPC runs as the caller under RLS, so the
+        short-lived results are cached per user, like the roster.
+        """
+        key = (user_id, query.lower(), tuple(sorted(centre_ids)), limit)
+        cache = self.db.caches.child_search
+        hit, rows = cache.get(key)
+        if hit:
+            return rows
+
+        try:
+            rows = self._read(
+                "search",
+                key,
+                lambda: self.db.client.rpc(
+                    "search_children",
+                    {"p_query": query, "p_centre_ids": list(centre_ids), "p_limit": limit},
+                ),
+            ) or []
+        except Exception as e:
+            return self._stale(cache, key, e)
+        cache.set(key, rows, {f"user:{user_id}"})
+        return rows
+
+
+def _case_tags(rows):
+    tags = set()
+    for row in rows or []:
+        if row.get("child_id"):
+            tags.add(f"child:{row['child_id']}")
+        if row.get("reported_by"):
+            tags.add(f"reporter:{row['reported_by']}")
+    return tags
+
+
+class CasesRepo(_Repo):
+    table = "cases"
+
+    def recent_for_user(self, role, user_id):
+        """First home-screen page as ``(cases, child_map, next_cursor)``.
+
+        Cached per role and user; served from the shared TTL cache until it
+        expires or a case write touches one of the user's children, reports
+        or (for parents) the parent themselves.
+        """
+        cache = self.db.caches.recent_cases
+        hit, value = cache.get((role, user_id))
+        if hit:
+            return value
+
+        try:
+            value = self.more_for_user(role, user_id, None)
+        except Exception as e:
+            return self._stale(cache, (role, user_id), e)
+        if role == "parent":
+            tags = {f"parent:{user_id}"} | {f"child:{c['child_id']}" for c in value[0]}
+        else:
+            tags = {f"reporter:{user_id}"}
+        cache.set((role, user_id), value, tags)
+        return value
+
+    def more_for_user(self, role, user_id, after):
+        """The page of cases after keyset cursor ``after``, with child names.
+
+        Child names come embedded in the same request, so a page is one
+        round trip for both parents and carers.
+        """
+        if role == "parent":
+            cases, cursor = self.page_for_parent(user_id, after)
+        else:
+            cases, cursor = self.page_by_reporter(user_id, after)
+        child_map = {
+            c["child_id"]: f"{c['child']['first_name']} {c['child']['last_name']}"
+            for c in cases
+            if c.get("child")
+        }
+        return cases, child_map, cursor
+
+    def page_for_parent(self, user_id, after=None, limit=PAGE_SIZE):
+        return self._page(
+            "page_for_parent",
+            (user_id,),
+            lambda: self._query()
+            .select(f"{CASE_LIST_COLUMNS}, child:children!inner(first_name, last_name)")
+            .contains("child.parent_ids", [user_id]),
+            after,
+            limit,
+        )
+
+    def page_by_reporter(self, user_id, after=None, limit=PAGE_SIZE):
+        return self._page(
+            "page_by_reporter",
+            (user_id,),
+            lambda: self._query()
+            .select(f"{CASE_LIST_COLUMNS}, child:children(first_name, last_name)")
+            .eq("reported_by", user_id),
+            after,
+            limit,
+        )
+
+    def _page(self, op, args, base, after, limit):
+        """Keyset page ordered by ``(created_at, id)`` descending.
+
+        ``after`` is the ``(created_at, id)`` of the last row already shown;
+        the filter seeks straight to it through the composite index instead
+        of scanning an OFFSET. Returns ``(rows, next_cursor)``.
+        """
+        def build():
+            query = base()
+            if after:
+                created_at, case_id = after
+                query = query.or_(
+                    f'created_at.lt."{created_at}",'
+                    f'and(created_at.eq."{created_at}",id.lt."{case_id}")'
+                )
+            return query.order("created_at", desc=True).order("id", desc=True).limit(limit + 1)
+
+        rows = self._read(op, args + (after, limit), build) or []
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, (rows[-1]["created_at"], rows[-1]["id"])
+
+    def load(self, case_id, view, user_id):
+        """One case projected to ``CASE_VIEW_COLUMNS[view]``, with ``child`` embedded.
+
+        Cached per viewer (the shared cache must not bypass row-level
+        security) and tagged ``case:<id>``, so re-opening a case is served
+        from memory until a write to it drops every viewer's copy.
+        """
+        key = (case_id, view, user_id)
+        cache = self.db.caches.cases
+        hit, case = cache.get(key)
+        if hit:
+            return case
+
+        try:
+            case = self._read(
+                "load",
+                key,
+                lambda: self._view_query(view).eq("id", case_id).maybe_single(),
+            )
+        except Exception as e:
+            return self._stale(cache, key, e)
+        if case:
+            self._cache_case(case, view, user_id)
+        return case
+
+    def prefetch(self, case_ids, view, user_id):
+        """Load ``view`` records for every case not yet cached, in one ``in_`` query.
+
+        Runs outside a rerun (from ``CasePrefetcher``), so it bypasses the
+        per-rerun coalescer. Returns the number of rows cached.
+        """
+        cache = self.db.caches.cases
+        missing = [cid for cid in dict.fromkeys(case_ids) if not cache.contains((cid, view, user_id))]
+        if not missing:
+            return 0
+        res = self.db.execute(self.table, "prefetch", self._view_query(view).in_("id", missing))
+        for case in res.data or []:
+            self._cache_case(case, view, user_id)
+        return len(res.data or [])
+
+    def _view_query(self, view):
+        return self._query().select(f"{CASE_VIEW_COLUMNS[view]}, child:children(first_name, last_name)")
+
+    def _cache_case(self, case, view, user_id):
+        self.db.caches.cases.set(
+            (case["id"], view, user_id), case, {f"case:{case['id']}"} | _case_tags([case])
+        )
+
+    def insert_many(self, rows, parent_ids=()):
+        """Insert cases in one request; rows already present are skipped.
+
+        Each row carries a client-generated ``id``, so resending a batch
+        whose response was lost inserts nothing twice.
+        """
+        res = self.db.execute(
+            self.table,
+            "insert",
+            self._query().upsert(rows, on_conflict="id", ignore_duplicates=True),
+            write=True,
+        )
+        self._invalidate(rows, parent_ids)
+        # The reporters' recent children (roster) now lead with these children
+        self.db.caches.roster.invalidate_tags({f"user:{row.get('reported_by')}" for row in rows})
+        return res.data
+
+    def acknowledge_many(self, case_ids, parent_id=None):
+        """Acknowledge every case in ``case_ids`` with one ``in_`` update.
+
+        Caches are invalidated once for the whole batch; ``parent_id``
+        also drops that parent's list when RLS returns no rows.
+        """
+        case_ids = list(dict.fromkeys(case_ids))
+        if not case_ids:
+            return []
+        res = self.db.execute(
+            self.table,
+            "acknowledge",
+            self._query()
+            .update({"acknowledged_by_parent": True, "status": "acknowledged"})
+            .in_("id", case_ids),
+            write=True,
+        )
+        self._invalidate(res.data, [parent_id] if parent_id else (), case_ids)
+        return res.data
+
+    def attach_photo(self, case_id, fields):
+        """Patch the photo columns once a background upload has finished."""
+        res = self.db.execute(
+            self.table, "attach_photo", self._query().update(fields).eq("id", case_id), write=True
+        )
+        self._invalidate(res.data, case_ids=[case_id])
+        return res.data
+
+    # ── Guidance queue (service-role client only; see guidance.py) ──
+    def claim_for_guidance(self, limit, max_attempts, lease_seconds):
+        """Lease up to ``limit`` pending cases, oldest first, for guidance."""
+        res = self.db.execute(
+            self.table,
+            "claim_guidance",
+            self.db.client.rpc(
+                "claim_guidance_batch",
+                {"p_limit": limit, "p_max_attempts": max_attempts, "p_lease": f"{lease_seconds} seconds"},
+            ),
+            write=True,
+        )
+        return res.data or []
+
+    def complete_guidance(self, cases, results):
+        """Write one batch of guidance back in a single call; ``results`` carry ``id``."""
+        res = self.db.execute(
+            self.table, "complete_guidance", self.db.client.rpc("complete_guidance", {"p_results": results}), write=True
+        )
+        self._invalidate(cases)
+        return res.data
+
+    def release_guidance(self, cases, max_attempts):
+        """Hand leased cases back to the queue; those out of attempts become ``guidance_failed``."""
+        self.db.execute(
+            self.table,
+            "release_guidance",
+            self.db.client.rpc(
+                "release_guidance", {"p_ids": [c["id"] for c in cases], "p_max_attempts": max_attempts}
+            ),
+            write=True,
+        )
+        self._invalidate(cases)
+
+    def guidance_queue_depth(self, max_attempts):
+        """Cases still waiting for guidance (exact count, no rows returned)."""
+        res = self.db.execute(
+            self.table,
+            "guidance_queue_depth",
+            self._query()
+            .select("id", count="exact", head=True)
+            .eq("status", "pending")
+            .lt("guidance_attempts", max_attempts),
+        )
+        return res.count or 0
+
+    def guidance_failed_count(self):
+        """Cases the worker gave up on (exact count, no rows returned)."""
+        res = self.db.execute(
+            self.table,
+            "guidance_failed_count",
+            self._query().select("id", count="exact", head=True).eq("status", "guidance_failed"),
+        )
+        return res.count or 0
+
+    def apply_remote_changes(self, rows, role, user_id):
+        """Drop cached entries touched by pushed (realtime) case changes.
+
+        ``rows`` carry ``id``, ``child_id`` and ``reported_by``. The
+        viewer's own list is dropped too: a new case may be for a child
+        whose tag is not on that list yet.
+        """
+        self.db.caches.recent_cases.invalidate((role, user_id))
+        self._invalidate(rows)
+
+    def _invalidate(self, rows, parent_ids=(), case_ids=()):
+        tags = _case_tags(rows) | {f"parent:{pid}" for pid in parent_ids or ()}
+        self.db.caches.recent_cases.invalidate_tags(tags)
+        case_ids = {row["id"] for row in rows or [] if row.get("id")} | set(case_ids)
+        self.db.caches.cases.invalidate_tags({f"case:{cid}" for cid in case_ids})
+        # Later reads in this run must not reuse results from before the write
+        self.db.loader.clear()
@@ -0,0 +1,9 @@
+-- Keyset pagination for the Recent Cases list.
+-- Pages are ordered by (created_at, id) descending and seek past the last
+-- row shown, so each list filter needs a matching composite index.
+
+create index if not exists cases_reported_by_created_at_id_idx
+    on public.cases (reported_by, created_at desc, id desc);
+
+create index if not exists cases_child_id_created_at_id_idx
+    on public.cases (child_id, created_at desc, id desc);
@@ -0,0 +1,5 @@
+-- The parent home list embeds children!inner and filters on
+-- children.parent_ids @> {user}; index the array for that containment test.
+
+create index if not exists children_parent_ids_gin_idx
+    on public.children using gin (parent_ids);
@@ -0,0 +1,64 @@
+-- Roster for the New Case child picker in a single call.
+-- Mirrors the old client-side cascade: the caller's own children (as carer
+-- or parent), else every child in the caller's centres, else all children
+-- visible to the caller. Labels are resolved as "Parent - Child" using the
+-- first listed parent's display name.
+
+create or replace function public.child_roster(
+    p_user_id uuid,
+    p_centre_ids uuid[] default '{}'
+)
+returns table (
+    id uuid,
+    first_name text,
+    last_name text,
+    centre_id uuid,
+    parent_ids uuid[],
+    label text
+)
+language sql
+stable
+security invoker
+as $$
+    with own as (
+        select c.*
+        from public.children c
+        where c.carer_ids @> array[p_user_id]
+           or c.parent_ids @> array[p_user_id]
+    ),
+    centre as (
+        select c.*
+        from public.children c
+        where not exists (select 1 from own)
+          and c.centre_id = any(p_centre_ids)
+    ),
+    everyone as (
+        select c.*
+        from public.children c
+        where not exists (select 1 from own)
+          and not exists (select 1 from centre)
+    ),
+    roster as (
+        select * from own
+        union all
+        select * from centre
+        union all
+        select * from everyone
+    )
+    select
+        r.id,
+        r.first_name,
+        r.last_name,
+        r.centre_id,
+        r.parent_ids,
+        coalesce(u.display_name || ' - ', '') || r.first_name || ' ' || r.last_name as label
+    from roster r
+    left join public.users u on u.id = r.parent_ids[1]
+    order by label;
+$$;
+
+create index if not exists children_carer_ids_gin_idx
+    on public.children using gin (carer_ids);
+
+create index if not exists children_centre_id_idx
+    on public.children (centre_id);
@@ -0,0 +1,153 @@
+-- Type-ahead child search and precomputed recent children per carer.
+-- The New Case picker no longer loads every child: it shows the carer's own
+-- and recently reported children from child_roster, and searches the rest
+-- through search_children (prefix + trigram on a normalised name column).
+
+create extension if not exists pg_trgm;
+
+alter table public.children
+    add column if not exists search_name text
+    generated always as (lower(first_name || ' ' || last_name)) stored;
+
+create index if not exists children_search_name_trgm_idx
+    on public.children using gin (search_name gin_trgm_ops);
+
+create index if not exists children_search_name_prefix_idx
+    on public.children (search_name text_pattern_ops);
+
+-- Recent children per carer, maintained on case insert.
+create table if not exists public.carer_recent_children (
+    carer_id uuid not null,
+    child_id uuid not null references public.children (id) on delete cascade,
+    last_reported_at timestamptz not null,
+    primary key (carer_id, child_id)
+);
+
+create index if not exists carer_recent_children_recent_idx
+    on public.carer_recent_children (carer_id, last_reported_at desc);
+
+alter table public.carer_recent_children enable row level security;
+
+drop policy if exists "carers read their recent children" on public.carer_recent_children;
+create policy "carers read their recent children"
+    on public.carer_recent_children for select
+    using (carer_id = auth.uid());
+
+insert into public.carer_recent_children (carer_id, child_id, last_reported_at)
+select reported_by, child_id, max(created_at)
+from public.cases
+where reported_by is not null and child_id is not null
+group by reported_by, child_id
+on conflict (carer_id, child_id) do update
+    set last_reported_at = greatest(carer_recent_children.last_reported_at, excluded.last_reported_at);
+
+create or replace function public.track_carer_recent_child()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if new.reported_by is not null and new.child_id is not null then
+        insert into public.carer_recent_children (carer_id, child_id, last_reported_at)
+        values (new.reported_by, new.child_id, coalesce(new.created_at, now()))
+        on conflict (carer_id, child_id) do update
+            set last_reported_at = greatest(carer_recent_children.last_reported_at, excluded.last_reported_at);
+    end if;
+    return new;
+end;
+$$;
+
+drop trigger if exists cases_track_carer_recent_child on public.cases;
+create trigger cases_track_carer_recent_child
+    after insert on public.cases
+    for each row execute function public.track_carer_recent_child();
+
+-- Own + recent children only; everyone else is reached through search.
+drop function if exists public.child_roster(uuid, uuid[]);
+
+create or replace function public.child_roster(
+    p_user_id uuid,
+    p_centre_ids uuid[] default '{}',
+    p_recent_limit int default 10
+)
+returns table (
+    id uuid,
+    first_name text,
+    last_name text,
+    centre_id uuid,
+    parent_ids uuid[],
+    label text,
+    recent_at timestamptz
+)
+language sql
+stable
+security invoker
+as $$
+    with recent as (
+        select rc.child_id, rc.last_reported_at
+        from public.carer_recent_children rc
+        where rc.carer_id = p_user_id
+        order by rc.last_reported_at desc
+        limit p_recent_limit
+    ),
+    roster as (
+        select c.*, r.last_reported_at as recent_at
+        from public.children c
+        left join recent r on r.child_id = c.id
+        where c.carer_ids @> array[p_user_id]
+           or c.parent_ids @> array[p_user_id]
+           or r.child_id is not null
+    )
+    select
+        r.id,
+        r.first_name,
+        r.last_name,
+        r.centre_id,
+        r.parent_ids,
+        coalesce(u.display_name || ' - ', '') || r.first_name || ' ' || r.last_name as label,
+        r.recent_at
+    from roster r
+    left join public.users u on u.id = r.parent_ids[1]
+    order by r.recent_at desc nulls last, label;
+$$;
+
+create or replace function public.search_children(
+    p_query text,
+    p_centre_ids uuid[] default '{}',
+    p_limit int default 20
+)
+returns table (
+    id uuid,
+    first_name text,
+    last_name text,
+    centre_id uuid,
+    parent_ids uuid[],
+    label text
+)
+language sql
+stable
+security invoker
+as $$
+    with q as (select lower(trim(p_query)) as term),
+    matches as (
+        select c.*,
+               c.search_name like q.term || '%' as is_prefix,
+               similarity(c.search_name, q.term) as score
+        from public.children c, q
+        where (cardinality(p_centre_ids) = 0 or c.centre_id = any(p_centre_ids))
+          and (c.search_name like q.term || '%' or c.search_name % q.term)
+        order by is_prefix desc, score desc, c.search_name
+        limit p_limit
+    )
+    select
+        m.id,
+        m.first_name,
+        m.last_name,
+        m.centre_id,
+        m.parent_ids,
+        coalesce(u.display_name || ' - ', '') || m.first_name || ' ' || m.last_name as label
+    from matches m
+    left join public.users u on u.id = m.parent_ids[1]
+    order by m.is_prefix desc, m.score desc, label;
+$$;
@@ -0,0 +1,6 @@
+-- Thumbnail variants stored next to the original photo at upload time.
+-- thumb_url is the 128px square, thumb_url_2x the 256px square for HiDPI.
+
+alter table public.cases
+    add column if not exists thumb_url text,
+    add column if not exists thumb_url_2x text;
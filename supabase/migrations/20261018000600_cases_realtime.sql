@@ -0,0 +1,12 @@
+-- Push inserts and updates on cases to Supabase Realtime subscribers.
+-- Realtime applies each subscriber's RLS policies, so parents and carers
+-- only receive changes to cases they can already select.
+do $$
+begin
+    if not exists (
+        select 1 from pg_publication_tables
+        where pubname = 'supabase_realtime' and schemaname = 'public' and tablename = 'cases'
+    ) then
+        alter publication supabase_realtime add table public.cases;
+    end if;
+end $$;
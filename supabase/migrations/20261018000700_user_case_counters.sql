@@ -0,0 +1,95 @@
+-- Per-user pending-acknowledgement counters, maintained on case writes.
+-- The header badge reads one row by primary key instead of counting
+-- cases by child_id and status on every page load.
+--   parents: their children's cases not yet acknowledged
+--   carers:  cases they reported that are still awaiting acknowledgement
+
+create table if not exists public.user_case_counters (
+    user_id uuid primary key,
+    pending_ack int not null default 0,
+    updated_at timestamptz not null default now()
+);
+
+alter table public.user_case_counters enable row level security;
+
+drop policy if exists "users read their own counters" on public.user_case_counters;
+create policy "users read their own counters"
+    on public.user_case_counters for select
+    using (user_id = auth.uid());
+
+-- Add p_delta to the counters of the case's reporter and the child's parents.
+create or replace function public.bump_case_counters(p_child_id uuid, p_reported_by uuid, p_delta int)
+returns void
+language sql
+security definer
+set search_path = public
+as $$
+    insert into public.user_case_counters as c (user_id, pending_ack)
+    select u.user_id, greatest(p_delta, 0)
+    from (
+        select unnest(ch.parent_ids) as user_id from public.children ch where ch.id = p_child_id
+        union
+        select p_reported_by
+    ) u
+    where u.user_id is not null
+    on conflict (user_id) do update
+        set pending_ack = greatest(c.pending_ack + p_delta, 0),
+            updated_at = now();
+$$;
+
+create or replace function public.track_case_counters()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') and not coalesce(old.acknowledged_by_parent, false) then
+        perform public.bump_case_counters(old.child_id, old.reported_by, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') and not coalesce(new.acknowledged_by_parent, false) then
+        perform public.bump_case_counters(new.child_id, new.reported_by, 1);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists cases_track_counters on public.cases;
+create trigger cases_track_counters
+    after insert or delete or update of acknowledged_by_parent, child_id, reported_by on public.cases
+    for each row execute function public.track_case_counters();
+
+-- Recompute every counter from cases; used for the backfill and after
+-- bulk changes the trigger does not see (e.g. a child's parent_ids).
+create or replace function public.rebuild_case_counters()
+returns void
+language sql
+security definer
+set search_path = public
+as $$
+    with pending as (
+        select unnest(ch.parent_ids) as user_id, cs.id as case_id
+        from public.cases cs
+        join public.children ch on ch.id = cs.child_id
+        where not coalesce(cs.acknowledged_by_parent, false)
+        union
+        select cs.reported_by, cs.id
+        from public.cases cs
+        where cs.reported_by is not null and not coalesce(cs.acknowledged_by_parent, false)
+    ),
+    totals as (
+        select user_id, count(*)::int as pending_ack from pending group by user_id
+    )
+    insert into public.user_case_counters as c (user_id, pending_ack)
+    select u.user_id, coalesce(t.pending_ack, 0)
+    from (select user_id from totals union select user_id from public.user_case_counters) u
+    left join totals t on t.user_id = u.user_id
+    on conflict (user_id) do update
+        set pending_ack = excluded.pending_ack,
+            updated_at = now();
+$$;
+
+revoke execute on function public.bump_case_counters(uuid, uuid, int) from public, anon, authenticated;
+revoke execute on function public.rebuild_case_counters() from public, anon, authenticated;
+
+select public.rebuild_case_counters();
@@ -0,0 +1,97 @@
+-- Work queue for the background guidance worker (guidance.py).
+-- New cases arrive as status 'pending'; a worker claims a batch
+-- ('processing'), asks its guidance backend, and writes the results back
+-- ('guided'). Claims are leased, so a batch held by a worker that died is
+-- picked up again once the lease runs out, up to p_max_attempts times.
+-- The functions run as the service role only.
+
+alter table public.cases
+    add column if not exists ai_recommendation text,
+    add column if not exists ai_category text,
+    add column if not exists ai_guidance text,
+    add column if not exists red_flags text[],
+    add column if not exists guidance_attempts int not null default 0,
+    add column if not exists guidance_claimed_at timestamptz;
+
+-- Oldest-first scan of the queue; stays small because guided and
+-- acknowledged cases drop out of it
+create index if not exists cases_guidance_queue_idx
+    on public.cases (created_at)
+    where status in ('pending', 'processing');
+
+create or replace function public.claim_guidance_batch(
+    p_limit int,
+    p_max_attempts int default 3,
+    p_lease interval default interval '10 minutes'
+)
+returns table (
+    id uuid,
+    child_id uuid,
+    reported_by uuid,
+    symptom_description text,
+    red_flags text[]
+)
+language sql
+security definer
+set search_path = public
+as $$
+    update public.cases c
+    set status = 'processing',
+        guidance_claimed_at = now(),
+        guidance_attempts = c.guidance_attempts + 1
+    where c.id in (
+        select q.id
+        from public.cases q
+        where (q.status = 'pending'
+               or (q.status = 'processing' and q.guidance_claimed_at < now() - p_lease))
+          and q.guidance_attempts < p_max_attempts
+        order by q.created_at
+        limit p_limit
+        for update skip locked
+    )
+    returning c.id, c.child_id, c.reported_by, c.symptom_description, c.red_flags;
+$$;
+
+-- Write a batch of results in one statement. A case acknowledged while
+-- its guidance was being generated keeps its status.
+create or replace function public.complete_guidance(p_results jsonb)
+returns setof uuid
+language sql
+security definer
+set search_path = public
+as $$
+    update public.cases c
+    set ai_recommendation = r.ai_recommendation,
+        ai_category = r.ai_category,
+        ai_guidance = r.ai_guidance,
+        red_flags = r.red_flags,
+        status = case when c.status = 'processing' then 'guided' else c.status end,
+        guidance_claimed_at = null
+    from jsonb_to_recordset(p_results) as r(
+        id uuid,
+        ai_recommendation text,
+        ai_category text,
+        ai_guidance text,
+        red_flags text[]
+    )
+    where c.id = r.id
+    returning c.id;
+$$;
+
+-- Hand a failed batch back to the queue straight away.
+create or replace function public.release_guidance(p_ids uuid[])
+returns void
+language sql
+security definer
+set search_path = public
+as $$
+    update public.cases
+    set status = 'pending',
+        guidance_claimed_at = null
+    where id = any(p_ids)
+      and status = 'processing';
+$$;
+
+revoke execute on function public.claim_guidance_batch(int, int, interval) from public, anon, authenticated;
+revoke execute on function public.complete_guidance(jsonb) from public, anon, authenticated;
+revoke execute on function public.release_guidance(uuid[]) from public, anon, authenticated;
@@ -0,0 +1,77 @@
+-- Cases the guidance worker gave up on. A case whose last allowed attempt
+-- fails (or whose worker died holding it) moves to 'guidance_failed'
+-- instead of sitting in 'pending' or 'processing' where nothing claims
+-- it again and the queue-depth count no longer sees it. The case screens
+-- show the state, and the worker reports how many cases are in it.
+
+create index if not exists cases_guidance_failed_idx
+    on public.cases (created_at)
+    where status = 'guidance_failed';
+
+-- Park cases left over from before this migration
+update public.cases
+set status = 'guidance_failed',
+    guidance_claimed_at = null
+where status in ('pending', 'processing')
+  and guidance_attempts >= 3
+  and (status = 'pending' or guidance_claimed_at < now() - interval '10 minutes');
+
+create or replace function public.claim_guidance_batch(
+    p_limit int,
+    p_max_attempts int default 3,
+    p_lease interval default interval '10 minutes'
+)
+returns table (
+    id uuid,
+    child_id uuid,
+    reported_by uuid,
+    symptom_description text,
+    red_flags text[]
+)
+language sql
+security definer
+set search_path = public
+as $$
+    -- Leases that ran out on the last attempt are not re-claimed: park them
+    with exhausted as (
+        update public.cases x
+        set status = 'guidance_failed',
+            guidance_claimed_at = null
+        where x.status = 'processing'
+          and x.guidance_claimed_at < now() - p_lease
+          and x.guidance_attempts >= p_max_attempts
+    )
+    update public.cases c
+    set status = 'processing',
+        guidance_claimed_at = now(),
+        guidance_attempts = c.guidance_attempts + 1
+    where c.id in (
+        select q.id
+        from public.cases q
+        where (q.status = 'pending'
+               or (q.status = 'processing' and q.guidance_claimed_at < now() - p_lease))
+          and q.guidance_attempts < p_max_attempts
+        order by q.created_at
+        limit p_limit
+        for update skip locked
+    )
+    returning c.id, c.child_id, c.reported_by, c.symptom_description, c.red_flags;
+$$;
+
+-- Hand a failed batch back to the queue, or park cases out of attempts.
+drop function if exists public.release_guidance(uuid[]);
+create or replace function public.release_guidance(p_ids uuid[], p_max_attempts int default 3)
+returns void
+language sql
+security definer
+set search_path = public
+as $$
+    update public.cases
+    set status = case when guidance_attempts >= p_max_attempts then 'guidance_failed' else 'pending' end,
+        guidance_claimed_at = null
+    where id = any(p_ids)
+      and status = 'processing';
+$$;
+
+revoke execute on function public.claim_guidance_batch(int, int, interval) from public, anon, authenticated;
+revoke execute on function public.release_guidance(uuid[], int) from public, anon, authenticated;
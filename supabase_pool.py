@@ -0,0 +1,197 @@
+"""Process-wide pooled Supabase transport with per-session auth binding.
+
+One ``httpx.Client`` (HTTP/2, keep-alive) is shared by every Streamlit
+session in the process. Each session only gets a thin ``SessionClient``
+that carries its own auth state and attaches the user's access token to
+requests sent over the shared pool.
+"""
+import os
+import threading
+
+import httpx
+from postgrest import SyncPostgrestClient
+from storage3 import SyncStorageClient
+from supabase_auth import SyncGoTrueClient
+
+from breaker import BudgetExceededError, Breakers, remaining_budget
+
+POOL_MAX_CONNECTIONS = 20
+POOL_MAX_KEEPALIVE = 10
+POOL_KEEPALIVE_EXPIRY = 60.0
+REQUEST_TIMEOUT = 20.0
+
+
+class ConnectionStats:
+    """Counts requests and whether each one opened or reused a connection."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.opened = 0
+
+    def record(self, opened: bool):
+        with self._lock:
+            self.requests += 1
+            if opened:
+                self.opened += 1
+
+    @property
+    def reused(self):
+        return self.requests - self.opened
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "opened": self.opened,
+                "reused": self.requests - self.opened,
+            }
+
+
+class CountingTransport(httpx.HTTPTransport):
+    """HTTP transport that records connection reuse via httpcore trace events."""
+
+    def __init__(self, stats: ConnectionStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    def handle_request(self, request):
+        opened = False
+        parent_trace = request.extensions.get("trace")
+
+        def trace(name, info):
+            nonlocal opened
+            if name in ("connection.connect_tcp.complete", "connection.connect_unix_socket.complete"):
+                opened = True
+            if parent_trace:
+                parent_trace(name, info)
+
+        request.extensions["trace"] = trace
+        # A call running under a latency budget (see breaker.py) gives each
+        # phase of its requests only what is left of it, not the pool-wide timeout
+        seconds = remaining_budget()
+        if seconds is not None:
+            if seconds <= 0:
+                raise BudgetExceededError("latency budget spent before the request started", request=request)
+            request.extensions["timeout"] = httpx.Timeout(seconds).as_dict()
+        response = super().handle_request(request)
+        self.stats.record(opened)
+        return response
+
+
+class SupabasePool:
+    """Shared transport and endpoint config; build once per process."""
+
+    def __init__(self, url: str, key: str):
+        base = url.rstrip("/")
+        self.key = key
+        self.rest_url = f"{base}/rest/v1"
+        self.auth_url = f"{base}/auth/v1"
+        self.storage_url = f"{base}/storage/v1/"
+        # Opened by the browser (nav component); REALTIME_URL points it at a local stand-in
+        self.realtime_url = os.getenv("REALTIME_URL") or (
+            base.replace("https://", "wss://", 1).replace("http://", "ws://", 1) + "/realtime/v1/websocket"
+        )
+        self.stats = ConnectionStats()
+        # One breaker per table / bucket, shared by every session
+        self.breakers = Breakers()
+        self.http = httpx.Client(
+            transport=CountingTransport(
+                self.stats,
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=POOL_MAX_CONNECTIONS,
+                    max_keepalive_connections=POOL_MAX_KEEPALIVE,
+                    keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+                ),
+            ),
+            timeout=REQUEST_TIMEOUT,
+            follow_redirects=True,
+        )
+
+    def session_client(self):
+        return SessionClient(self)
+
+    def headers(self, access_token=None):
+        return {
+            "apiKey": self.key,
+            "Authorization": f"Bearer {access_token or self.key}",
+        }
+
+
+class SessionClient:
+    """Per-session Supabase facade over a shared ``SupabasePool``.
+
+    Exposes the subset of the ``supabase.Client`` surface the app uses
+    (``auth``, ``table``, ``rpc``, ``storage``). Sub-clients are rebuilt
+    only when the bound access token changes, and never open their own
+    connections.
+    """
+
+    def __init__(self, pool: SupabasePool):
+        self._pool = pool
+        self.access_token = None
+        self._postgrest = None
+        self._storage = None
+        self.auth = SyncGoTrueClient(
+            url=pool.auth_url,
+            headers=pool.headers(),
+            http_client=pool.http,
+            auto_refresh_token=False,
+            persist_session=False,
+        )
+        self.auth.on_auth_state_change(self._on_auth_event)
+
+    def _on_auth_event(self, event, session):
+        if event in ("SIGNED_IN", "TOKEN_REFRESHED", "SIGNED_OUT"):
+            self.bind(session.access_token if session else None)
+
+    def bind(self, access_token):
+        """Attach ``access_token`` to subsequent data and storage requests."""
+        if access_token == self.access_token:
+            return
+        self.access_token = access_token
+        self._postgrest = None
+        self._storage = None
+
+    @property
+    def postgrest(self):
+        if self._postgrest is None:
+            self._postgrest = SyncPostgrestClient(
+                self._pool.rest_url,
+                headers=self._pool.headers(self.access_token),
+                http_client=self._pool.http,
+            )
+        return self._postgrest
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            self._storage = SyncStorageClient(
+                self._pool.storage_url,
+                self._pool.headers(self.access_token),
+                http_client=self._pool.http,
+            )
+        return self._storage
+
+    @property
+    def http(self):
+        """The shared pooled ``httpx.Client`` (for raw Storage/TUS requests)."""
+        return self._pool.http
+
+    @property
+    def breakers(self):
+        return self._pool.breakers
+
+    @property
+    def storage_url(self):
+        return self._pool.storage_url
+
+    def request_headers(self):
+        return self._pool.headers(self.access_token)
+
+    def table(self, table_name: str):
+        return self.postgrest.from_(table_name)
+
+    def rpc(self, fn: str, params=None):
+        return self.postgrest.rpc(fn, params or {})
@@ -0,0 +1,152 @@
+import base64
+import json
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from supabase_auth.errors import AuthApiError
+
+import auth_session
+from auth_session import AuthSessionError, AuthUnavailableError, SessionManager, jwt_expiry
+from breaker import Breakers
+
+
+def make_jwt(exp):
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).rstrip(b"=").decode()
+    return f"header.{payload}.signature"
+
+
+class FakeTimer:
+    def __init__(self, delay, fn, args=()):
+        self.delay = delay
+        self.cancelled = False
+
+    def start(self):
+        pass
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class FakeAuth:
+    def __init__(self):
+        self.fail_with = None
+        self.refreshes = 0
+
+    def refresh_session(self, refresh_token):
+        self.refreshes += 1
+        if self.fail_with:
+            raise self.fail_with
+        token = make_jwt(int(time.time()) + 3600)
+        return SimpleNamespace(session=SimpleNamespace(access_token=token, refresh_token="r2"))
+
+
+class FakeClient:
+    def __init__(self):
+        self.auth = FakeAuth()
+        self.breakers = Breakers(failures=100)
+        self.bound = None
+
+    def bind(self, access_token):
+        self.bound = access_token
+
+
+@pytest.fixture(autouse=True)
+def fake_timer(monkeypatch):
+    monkeypatch.setattr(auth_session.threading, "Timer", FakeTimer)
+
+
+@pytest.fixture
+def client():
+    return FakeClient()
+
+
+REJECTED = AuthApiError("Invalid Refresh Token: Refresh Token Not Found", 400, "refresh_token_not_found")
+
+
+def test_jwt_expiry_reads_the_exp_claim():
+    assert jwt_expiry(make_jwt(1700000000)) == 1700000000
+    assert jwt_expiry(make_jwt(None)) is None
+    assert jwt_expiry("not-a-jwt") is None
+    assert jwt_expiry(None) is None
+
+
+def test_valid_token_is_restored_without_a_refresh(client):
+    token = make_jwt(int(time.time()) + 600)
+    manager = SessionManager(client)
+    manager.start(token, "r1")
+    assert manager.ensure_valid() == (token, "r1")
+    assert client.auth.refreshes == 0
+    assert client.bound == token
+
+
+def test_expired_token_is_refreshed_on_demand(client):
+    manager = SessionManager(client)
+    manager.start(make_jwt(int(time.time()) - 10), "r1")
+    access_token, refresh_token = manager.ensure_valid()
+    assert refresh_token == "r2"
+    assert jwt_expiry(access_token) > time.time()
+
+
+@pytest.mark.parametrize("error", [httpx.ConnectError("reset"), httpx.ReadTimeout("slow")])
+def test_background_network_error_keeps_the_valid_token_and_retries(client, error):
+    token = make_jwt(int(time.time()) + 30)
+    manager = SessionManager(client)
+    manager.start(token, "r1")
+    client.auth.fail_with = error
+    manager._refresh_in_background(0)
+    assert manager.ensure_valid() == (token, "r1")
+    assert manager._timer.delay == auth_session.RETRY_DELAYS[0]
+
+
+def test_background_retries_continue_until_the_token_expires(client):
+    manager = SessionManager(client)
+    manager.start(make_jwt(int(time.time()) + 30), "r1")
+    client.auth.fail_with = httpx.ConnectError("reset")
+    manager._refresh_in_background(len(auth_session.RETRY_DELAYS) + 3)
+    assert manager._timer.delay == auth_session.RETRY_DELAYS[-1]
+
+
+def test_background_rejection_ends_the_session(client):
+    manager = SessionManager(client)
+    manager.start(make_jwt(int(time.time()) + 30), "r1")
+    client.auth.fail_with = REJECTED
+    manager._refresh_in_background(0)
+    with pytest.raises(AuthSessionError):
+        manager.ensure_valid()
+
+
+@pytest.mark.parametrize("error", [httpx.ConnectError("dns"), AuthApiError("upstream", 500, None)])
+def test_auth_outage_on_an_expired_token_does_not_sign_out(client, error):
+    manager = SessionManager(client)
+    manager.start(make_jwt(int(time.time()) - 10), "r1")
+    client.auth.fail_with = error
+    with pytest.raises(AuthUnavailableError):
+        manager.ensure_valid()
+    client.auth.fail_with = None
+    assert manager.ensure_valid()[1] == "r2"
+
+
+def test_open_auth_breaker_does_not_sign_out(client):
+    client.breakers = Breakers(failures=1, reset_after=60)
+    manager = SessionManager(client)
+    manager.start(make_jwt(int(time.time()) - 10), "r1")
+    client.auth.fail_with = httpx.ConnectError("down")
+    with pytest.raises(AuthUnavailableError):
+        manager.ensure_valid()
+    refreshes = client.auth.refreshes
+    with pytest.raises(AuthUnavailableError):
+        manager.ensure_valid()  # CircuitOpenError, without another call to Auth
+    assert client.auth.refreshes == refreshes
+
+
+def test_rejected_refresh_on_an_expired_token_signs_out(client):
+    manager = SessionManager(client)
+    manager.start(make_jwt(int(time.time()) - 10), "r1")
+    client.auth.fail_with = REJECTED
+    with pytest.raises(AuthSessionError):
+        manager.ensure_valid()
+    client.auth.fail_with = None
+    with pytest.raises(AuthSessionError):
+        manager.ensure_valid()  # sticky until the next sign-in
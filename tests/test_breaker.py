@@ -0,0 +1,142 @@
+import httpx
+import pytest
+from postgrest.exceptions import APIError
+from supabase_auth.errors import AuthApiError, AuthRetryableError
+
+import breaker
+from breaker import (
+    BudgetExceededError,
+    Breakers,
+    CircuitBreaker,
+    CircuitOpenError,
+    call_budget,
+    is_backend_failure,
+    remaining_budget,
+)
+from supabase_pool import ConnectionStats, CountingTransport
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(breaker.time, "monotonic", clock)
+    return clock
+
+
+def down():
+    raise httpx.ConnectTimeout("timed out")
+
+
+def test_opens_after_consecutive_failures_and_rejects_fast(clock):
+    breakers = Breakers(failures=2, reset_after=30)
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectTimeout):
+            breakers.call("cases", down, 1)
+    with pytest.raises(CircuitOpenError):
+        breakers.call("cases", lambda: "never called", 1)
+    assert breakers.stats()["cases"] == {"state": "open", "trips": 1, "rejected": 1, "calls": 2, "failed": 2}
+
+
+def test_success_resets_the_failure_count(clock):
+    b = CircuitBreaker("cases", failures=2, reset_after=30)
+    b.record_failure()
+    b.record_success()
+    b.record_failure()
+    assert b.state == "closed"
+
+
+def test_half_open_lets_one_probe_through(clock):
+    b = CircuitBreaker("cases", failures=1, reset_after=30)
+    b.record_failure()
+    clock.now += 30
+    assert b.state == "half_open"
+    b.before_call()
+    with pytest.raises(CircuitOpenError):
+        b.before_call()  # a second caller waits for the probe
+    b.record_success()
+    assert b.state == "closed"
+
+
+def test_failed_probe_reopens(clock):
+    b = CircuitBreaker("cases", failures=1, reset_after=30)
+    b.record_failure()
+    clock.now += 30
+    b.before_call()
+    b.record_failure()
+    assert b.state == "open"
+    assert b.trips == 2
+
+
+def test_request_errors_do_not_count_against_the_backend(clock):
+    breakers = Breakers(failures=1, reset_after=30)
+
+    def rejected():
+        raise APIError({"code": "23505", "message": "duplicate key"})
+
+    with pytest.raises(APIError):
+        breakers.call("cases", rejected, 1)
+    assert breakers.get("cases").state == "closed"
+
+
+def test_budget_is_visible_only_during_the_call():
+    breakers = Breakers()
+    assert breakers.call("cases", call_budget, 2.5) == 2.5
+    assert call_budget() is None
+
+
+def test_budget_is_one_deadline_for_the_whole_call(clock):
+    def two_requests():
+        first = remaining_budget()
+        clock.now += 3
+        return first, remaining_budget()
+
+    assert Breakers().call("cases", two_requests, 4) == (4, 1)
+
+
+def test_a_slow_answer_counts_as_a_failure(clock):
+    breakers = Breakers(failures=1, reset_after=30)
+
+    def slow():
+        clock.now += 5
+        return "late"
+
+    assert breakers.call("cases", slow, 4) == "late"
+    assert breakers.get("cases").state == "open"
+
+
+def test_transport_refuses_to_start_a_request_past_the_deadline(clock):
+    transport = CountingTransport(ConnectionStats())
+
+    def late_request():
+        clock.now += 5
+        transport.handle_request(httpx.Request("GET", "http://localhost:9/rest/v1/cases"))
+
+    with pytest.raises(BudgetExceededError):
+        Breakers().call("cases", late_request, 4)
+
+
+@pytest.mark.parametrize(
+    "exc, expected",
+    [
+        (httpx.ReadTimeout("slow"), True),
+        (BudgetExceededError("spent"), True),
+        (APIError({"code": 503, "message": "unavailable"}), True),
+        (APIError({"code": "PGRST001", "message": "no connection"}), True),
+        (APIError({"code": "57014", "message": "statement timeout"}), True),
+        (APIError({"code": "42501", "message": "denied"}), False),
+        (AuthRetryableError("auth unreachable", 0), True),
+        (AuthApiError("Invalid login credentials", 400, "invalid_credentials"), False),
+        (AuthApiError("upstream error", 500, None), True),
+        (ValueError("bug"), False),
+    ],
+)
+def test_is_backend_failure(exc, expected):
+    assert is_backend_failure(exc) is expected
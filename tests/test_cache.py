@@ -0,0 +1,103 @@
+import cache
+from cache import TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    return clock
+
+
+def test_entry_is_served_until_its_ttl_runs_out(monkeypatch):
+    clock = make_clock(monkeypatch)
+    c = TTLCache(10)
+    c.set("k", ["case"])
+    clock.now += 9
+    assert c.get("k") == (True, ["case"])
+    clock.now += 1
+    assert c.get("k") == (False, None)
+    assert (c.stats()["hits"], c.stats()["misses"]) == (1, 1)
+
+
+def test_invalidating_a_tag_drops_only_its_entries(monkeypatch):
+    make_clock(monkeypatch)
+    c = TTLCache(10)
+    c.set(("reporter", "u1"), "a", {"reporter:u1", "child:k1"})
+    c.set(("parent", "p1"), "b", {"child:k1"})
+    c.set(("reporter", "u2"), "c", {"reporter:u2", "child:k2"})
+    c.invalidate_tags({"child:k1"})
+    assert not c.contains(("reporter", "u1")) and not c.contains(("parent", "p1"))
+    assert c.get(("reporter", "u2")) == (True, "c")
+    c.set(("reporter", "u1"), "a2", {"reporter:u1"})  # a re-set entry drops its old tags
+    c.invalidate_tags({"child:k1"})
+    assert c.contains(("reporter", "u1"))
+
+
+def test_full_cache_evicts_the_entry_closest_to_expiry(monkeypatch):
+    clock = make_clock(monkeypatch)
+    c = TTLCache(10, max_entries=2)
+    c.set("old", 1)
+    clock.now += 1
+    c.set("new", 2)
+    c.set("newest", 3)
+    assert not c.contains("old")
+    assert c.stats()["entries"] == 2
+
+
+def test_expired_entry_misses_but_is_served_stale(monkeypatch):
+    clock = make_clock(monkeypatch)
+    c = TTLCache(10, stale_ttl=60)
+    c.set("k", "v")
+    clock.now += 11
+    assert c.get("k") == (False, None)
+    assert not c.contains("k")
+    assert c.get_stale("k") == (True, "v")
+    clock.now += 60
+    assert c.get_stale("k") == (False, None)
+
+
+def test_no_stale_reads_without_stale_ttl(monkeypatch):
+    clock = make_clock(monkeypatch)
+    c = TTLCache(10)
+    c.set("k", "v")
+    clock.now += 11
+    assert c.get("k") == (False, None)
+    assert c.get_stale("k") == (False, None)
+    assert c.stats()["entries"] == 0
+
+
+def test_invalidated_entries_are_never_served_stale(monkeypatch):
+    make_clock(monkeypatch)
+    c = TTLCache(10, stale_ttl=60)
+    c.set("k", "v", {"case:1"})
+    c.invalidate_tags({"case:1"})
+    assert c.get_stale("k") == (False, None)
+
+
+def test_byte_budget_evicts_entries_closest_to_expiry(monkeypatch):
+    clock = make_clock(monkeypatch)
+    c = TTLCache(10, max_bytes=30)
+    c.set("old", "x" * 10)  # 12 bytes as JSON
+    clock.now += 1
+    c.set("new", "y" * 10)
+    clock.now += 1
+    c.set("newest", "z" * 10)
+    assert not c.contains("old")
+    assert c.contains("new") and c.contains("newest")
+    assert c.bytes == 24
+
+
+def test_value_larger_than_the_budget_is_not_cached(monkeypatch):
+    make_clock(monkeypatch)
+    c = TTLCache(10, max_bytes=8)
+    c.set("k", "x" * 10)
+    assert not c.contains("k")
+    assert c.bytes == 0
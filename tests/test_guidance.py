@@ -0,0 +1,130 @@
+from types import SimpleNamespace
+
+import pytest
+
+import guidance
+from guidance import GUIDANCE_FAILED, GUIDANCE_MAX_ATTEMPTS, GuidanceWorker, StubGuidanceBackend, load_backend
+
+
+class FakeCases:
+    """In-memory stand-in for the guidance queue RPCs (see the migrations)."""
+
+    def __init__(self, descriptions):
+        self.rows = {
+            f"c{i}": {"id": f"c{i}", "symptom_description": text, "red_flags": [], "status": "pending", "attempts": 0}
+            for i, text in enumerate(descriptions)
+        }
+        self.completed = []
+        self.released = []
+
+    def claim_for_guidance(self, limit, max_attempts, lease_seconds):
+        claimed = [r for r in self.rows.values() if r["status"] == "pending" and r["attempts"] < max_attempts][:limit]
+        for row in claimed:
+            row["status"] = "processing"
+            row["attempts"] += 1
+        return [{k: row[k] for k in ("id", "symptom_description", "red_flags")} for row in claimed]
+
+    def complete_guidance(self, cases, results):
+        self.completed.append(results)
+        for result in results:
+            self.rows[result["id"]].update(result, status="guided")
+
+    def release_guidance(self, cases, max_attempts):
+        self.released.append([c["id"] for c in cases])
+        for case in cases:
+            row = self.rows[case["id"]]
+            row["status"] = GUIDANCE_FAILED if row["attempts"] >= max_attempts else "pending"
+
+    def guidance_queue_depth(self, max_attempts):
+        return sum(r["status"] == "pending" and r["attempts"] < max_attempts for r in self.rows.values())
+
+    def guidance_failed_count(self):
+        return sum(r["status"] == GUIDANCE_FAILED for r in self.rows.values())
+
+
+class BrokenBackend:
+    name = "broken"
+
+    def generate(self, cases):
+        raise RuntimeError("model unavailable")
+
+
+def make_worker(descriptions, backend=None, batch_size=8):
+    cases = FakeCases(descriptions)
+    worker = GuidanceWorker(SimpleNamespace(cases=cases), backend or StubGuidanceBackend(),
+                            concurrency=0, batch_size=batch_size, poll=0)
+    return worker, cases
+
+
+def test_stub_backend_is_deterministic():
+    backend = load_backend("stub")
+    cases = [{"symptom_description": "Wheezing after lunch"}, {"symptom_description": "Seems a bit quiet"}]
+    first = backend.generate(cases)
+    assert first == backend.generate(cases)
+    assert [r["ai_category"] for r in first] == ["Respiratory", "General"]
+
+
+def test_run_once_claims_a_batch_and_completes_it_in_one_call():
+    worker, cases = make_worker(["high fever", "itchy rash", "fell over"], batch_size=2)
+    assert worker.run_once() == 2
+    assert len(cases.completed) == 1
+    assert [r["ai_category"] for r in cases.completed[0]] == ["Fever", "Skin"]
+    assert [r["status"] for r in cases.rows.values()] == ["guided", "guided", "pending"]
+
+
+def test_local_red_flags_are_kept_alongside_the_backends():
+    class FlaggingBackend(StubGuidanceBackend):
+        def generate(self, batch):
+            return [{**r, "red_flags": ["Seizure"]} for r in super().generate(batch)]
+
+    worker, cases = make_worker(["fitting"], backend=FlaggingBackend())
+    cases.rows["c0"]["red_flags"] = ["Seizure", "Very high temperature"]
+    worker.run_once()
+    assert cases.rows["c0"]["red_flags"] == ["Seizure", "Very high temperature"]
+
+
+def test_failed_batch_is_released_and_counted():
+    worker, cases = make_worker(["cough", "cold"], backend=BrokenBackend())
+    with pytest.raises(RuntimeError):
+        worker.run_once()
+    assert cases.released == [["c0", "c1"]]
+    assert [r["status"] for r in cases.rows.values()] == ["pending", "pending"]
+    assert worker.stats()["failed"] == 2
+    assert worker.in_flight == 0
+
+
+def test_short_backend_answer_is_treated_as_a_failure():
+    class ShortBackend:
+        def generate(self, batch):
+            return []
+
+    worker, cases = make_worker(["cough"], backend=ShortBackend())
+    with pytest.raises(ValueError):
+        worker.run_once()
+    assert cases.completed == []
+    assert cases.released == [["c0"]]
+
+
+def test_case_out_of_attempts_is_marked_and_reported():
+    worker, cases = make_worker(["cough"], backend=BrokenBackend())
+    for _ in range(GUIDANCE_MAX_ATTEMPTS):
+        with pytest.raises(RuntimeError):
+            worker.run_once()
+    assert cases.rows["c0"]["status"] == GUIDANCE_FAILED
+    assert worker.run_once() == 0  # never claimed again
+    stats = worker.stats()
+    assert (stats["queue_depth"], stats["gave_up"]) == (0, 1)
+
+
+def test_stats_report_throughput_and_queue_depth(monkeypatch):
+    clock = SimpleNamespace(now=100.0)
+    monkeypatch.setattr(guidance.time, "monotonic", lambda: clock.now)
+    worker, cases = make_worker(["cough"] * 5, batch_size=2)
+    worker.start()  # concurrency=0: only starts the throughput clock
+    worker.run_once()
+    worker.run_once()
+    clock.now += 60
+    stats = worker.stats()
+    assert (stats["processed"], stats["batches"], stats["queue_depth"], stats["gave_up"]) == (4, 2, 1, 0)
+    assert stats["per_minute"] == 4.0
+    assert stats["backend"] == "stub"
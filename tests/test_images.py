@@ -0,0 +1,94 @@
+import io
+
+import pytest
+from PIL import Image
+
+from images import preprocess
+
+ORIENTATION = 0x0112
+GPS_IFD = 0x8825
+
+
+def photo_bytes(size, fmt="JPEG", mode="RGB", orientation=None, gps=False):
+    img = Image.new(mode, size, (200, 120, 40) if mode == "RGB" else (200, 120, 40, 0))
+    exif = Image.Exif()
+    if orientation:
+        exif[ORIENTATION] = orientation
+    if gps:
+        exif[GPS_IFD] = {1: "N", 2: (51.0, 30.0, 0.0)}
+    buf = io.BytesIO()
+    img.save(buf, fmt, exif=exif.tobytes())
+    return buf.getvalue()
+
+
+def opened(data):
+    return Image.open(io.BytesIO(data))
+
+
+def test_large_photo_is_downsized_to_the_max_edge():
+    processed = preprocess(photo_bytes((3000, 2000)), max_edge=1600)
+    with opened(processed.data) as img:
+        assert img.size == (1600, 1067)
+        assert img.format == "JPEG"
+    assert (processed.content_type, processed.extension) == ("image/jpeg", "jpg")
+    assert processed.bytes_saved > 0
+
+
+def test_small_photo_is_not_upscaled():
+    with opened(preprocess(photo_bytes((800, 600)), max_edge=1600).data) as img:
+        assert img.size == (800, 600)
+
+
+def test_exif_orientation_is_applied_then_dropped():
+    # Orientation 6: stored landscape, shown rotated a quarter turn to portrait
+    processed = preprocess(photo_bytes((400, 300), orientation=6, gps=True), max_edge=1600)
+    with opened(processed.data) as img:
+        assert img.size == (300, 400)
+        assert not img.getexif()
+        assert "exif" not in img.info and "icc_profile" not in img.info
+
+
+def test_file_source_is_read_from_the_start():
+    source = io.BytesIO(photo_bytes((400, 300)))
+    source.seek(100)
+    processed = preprocess(source, max_edge=200)
+    assert processed.original_size == len(source.getvalue())
+    with opened(processed.data) as img:
+        assert img.size == (200, 150)
+
+
+def test_webp_keeps_transparency_and_jpeg_flattens_it():
+    source = photo_bytes((300, 200), fmt="PNG", mode="RGBA")
+    webp = preprocess(source, fmt="WEBP")
+    with opened(webp.data) as img:
+        assert (img.format, img.mode) == ("WEBP", "RGBA")
+    assert webp.content_type == "image/webp"
+    with opened(preprocess(source, fmt="JPEG").data) as img:
+        assert img.mode == "RGB"
+        assert img.getpixel((0, 0)) == pytest.approx((255, 255, 255), abs=2)
+
+
+def test_square_thumbnails_are_cut_for_each_size():
+    processed = preprocess(photo_bytes((3000, 2000)), thumb_sizes=(128, 256))
+    assert sorted(processed.thumbnails) == [128, 256]
+    for edge, data in processed.thumbnails.items():
+        with opened(data) as img:
+            assert img.size == (edge, edge)
+            assert img.format == "JPEG"
+            assert not img.getexif()
+    assert processed.total_size == len(processed.data) + sum(map(len, processed.thumbnails.values()))
+
+
+def test_thumbnails_follow_the_exif_orientation():
+    # Stored landscape with the left half red; shown portrait, red on top
+    img = Image.new("RGB", (300, 100), (0, 0, 255))
+    img.paste((255, 0, 0), (0, 0, 150, 100))
+    exif = Image.Exif()
+    exif[ORIENTATION] = 6
+    buf = io.BytesIO()
+    img.save(buf, "PNG", exif=exif.tobytes())
+    thumb = preprocess(buf.getvalue(), thumb_sizes=(128,)).thumbnails[128]
+    with opened(thumb) as img:
+        top, bottom = img.getpixel((64, 10)), img.getpixel((64, 118))
+    assert top[0] > 200 and top[2] < 60
+    assert bottom[2] > 200 and bottom[0] < 60
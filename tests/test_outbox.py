@@ -0,0 +1,218 @@
+import pytest
+from postgrest.exceptions import APIError
+
+from outbox import Outbox
+
+
+class FakeClient:
+    def __init__(self, access_token="token"):
+        self.access_token = access_token
+
+
+class FakeCases:
+    def __init__(self):
+        self.calls = []
+        self.fail_with = {}  # case id -> exception raised while it is in a batch
+
+    def _check(self, ids):
+        for case_id in ids:
+            if case_id in self.fail_with:
+                raise self.fail_with[case_id]
+
+    def insert_many(self, rows, parent_ids=()):
+        ids = [row["id"] for row in rows]
+        self.calls.append(("insert", ids))
+        self._check(ids)
+
+    def acknowledge_many(self, case_ids, parent_id=None):
+        self.calls.append(("acknowledge", list(case_ids)))
+        self._check(case_ids)
+
+    def attach_photo(self, case_id, fields):
+        self.calls.append(("photo", case_id))
+        self._check([case_id])
+
+
+class FakeDb:
+    def __init__(self, access_token="token"):
+        self.client = FakeClient(access_token)
+        self.cases = FakeCases()
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return Outbox(str(tmp_path / "outbox.sqlite3"), flusher=False)
+
+
+def test_bulk_acknowledge_is_one_batch(outbox):
+    db = FakeDb()
+    outbox.register("u1", db)
+    outbox.enqueue_acknowledge("u1", [f"c{i}" for i in range(6)])
+    outbox.flush()
+    assert db.cases.calls == [("acknowledge", [f"c{i}" for i in range(6)])]
+    assert outbox.stats()["pending"] == 0
+
+
+def test_consecutive_inserts_batch_and_photos_go_singly_in_order(outbox):
+    db = FakeDb()
+    outbox.register("u1", db)
+    outbox.enqueue_case("u1", {"id": "a"})
+    outbox.enqueue_case("u1", {"id": "b"})
+    outbox.enqueue_photo(db, "u1", "b", {"photo_url": "x"})
+    outbox.enqueue_case("u1", {"id": "c"})
+    outbox.flush()
+    assert db.cases.calls == [("insert", ["a", "b"]), ("photo", "b"), ("insert", ["c"])]
+
+
+def test_duplicate_enqueue_is_ignored(outbox):
+    db = FakeDb()
+    outbox.register("u1", db)
+    outbox.enqueue_case("u1", {"id": "a"})
+    outbox.enqueue_case("u1", {"id": "a"})
+    outbox.flush()
+    assert db.cases.calls == [("insert", ["a"])]
+
+
+def test_nothing_is_sent_without_a_signed_in_session(outbox):
+    outbox.enqueue_case("u1", {"id": "a"})
+    signed_out = FakeDb(access_token=None)
+    outbox.register("u1", signed_out)
+    outbox.flush()
+    assert signed_out.cases.calls == []
+    assert outbox.stats()["pending"] == 1
+
+
+def test_retriable_failure_backs_off_and_blocks_later_writes(outbox):
+    db = FakeDb()
+    db.cases.fail_with["a"] = ConnectionError("down")
+    outbox.register("u1", db)
+    outbox.enqueue_case("u1", {"id": "a"})
+    outbox.enqueue_photo(db, "u1", "a", {"photo_url": "x"})
+    outbox.flush()
+    outbox.flush()  # still backing off: nothing is resent, the photo stays behind the insert
+    assert db.cases.calls == [("insert", ["a"])]
+    stats = outbox.stats()
+    assert (stats["pending"], stats["failed"], stats["delivered"]) == (2, 0, 0)
+
+
+def test_permanent_failure_holds_the_case_until_retried(outbox):
+    db = FakeDb()
+    db.cases.fail_with["a"] = APIError({"code": "23503", "message": "fk"})
+    outbox.register("u1", db)
+    outbox.enqueue_case("u1", {"id": "a"})
+    outbox.enqueue_photo(db, "u1", "a", {"photo_url": "x"})
+    outbox.enqueue_case("u1", {"id": "b"})
+    outbox.flush()
+    outbox.flush()  # other cases carry on; the photo stays held behind the failed insert
+    assert db.cases.calls == [("insert", ["a"]), ("insert", ["b"])]
+    assert [e["status"] for e in outbox.pending("u1")] == ["failed", "pending"]
+
+    del db.cases.fail_with["a"]
+    outbox.retry("u1", "a")
+    outbox.flush()
+    assert db.cases.calls[2:] == [("insert", ["a"]), ("photo", "a")]
+    assert outbox.pending("u1") == []
+
+
+def test_discard_drops_the_failed_write_and_what_was_held_behind_it(outbox):
+    db = FakeDb()
+    db.cases.fail_with["a"] = APIError({"code": "23503", "message": "fk"})
+    outbox.register("u1", db)
+    outbox.enqueue_case("u1", {"id": "a"})
+    outbox.enqueue_photo(db, "u1", "a", {"photo_url": "x"})
+    outbox.flush()
+    outbox.discard("u1", "a")
+    assert outbox.pending("u1") == []
+
+
+def test_acknowledging_again_retries_a_failed_acknowledgement(outbox):
+    db = FakeDb()
+    db.cases.fail_with["a"] = APIError({"code": "42501", "message": "denied"})
+    outbox.register("u1", db)
+    outbox.enqueue_acknowledge("u1", ["a"])
+    outbox.flush()
+    assert outbox.pending("u1")[0]["status"] == "failed"
+
+    del db.cases.fail_with["a"]
+    outbox.enqueue_acknowledge("u1", ["a"])
+    outbox.flush()
+    assert db.cases.calls == [("acknowledge", ["a"]), ("acknowledge", ["a"])]
+    assert outbox.pending("u1") == []
+
+
+def test_permanent_batch_failure_only_fails_the_bad_entry(outbox):
+    db = FakeDb()
+    db.cases.fail_with["b"] = APIError({"code": "23503", "message": "fk"})
+    outbox.register("u1", db)
+    for case_id in "abcd":
+        outbox.enqueue_case("u1", {"id": case_id})
+    outbox.flush()
+    assert db.cases.calls == [
+        ("insert", ["a", "b", "c", "d"]),
+        ("insert", ["a", "b"]),
+        ("insert", ["a"]),
+        ("insert", ["b"]),
+        ("insert", ["c", "d"]),
+    ]
+    assert [(e["payload"]["id"], e["status"]) for e in outbox.pending("u1")] == [("b", "failed")]
+
+
+def test_retriable_error_while_bisecting_leaves_the_rest_unsent(outbox):
+    db = FakeDb()
+    db.cases.fail_with["b"] = APIError({"code": "42501", "message": "denied"})
+    outbox.register("u1", db)
+    outbox.enqueue_acknowledge("u1", ["a", "b", "c", "d"])
+    db.cases.fail_with["c"] = ConnectionError("down")
+    outbox.flush()
+    # [a, b, c, d] and [a, b] fail on b, a goes, b fails; [c, d] hits the outage
+    assert db.cases.calls[-1] == ("acknowledge", ["c", "d"])
+    assert [(e["payload"]["id"], e["status"]) for e in outbox.pending("u1")] == [
+        ("b", "failed"), ("c", "pending"), ("d", "pending"),
+    ]
+
+
+class FakeAuth:
+    def __init__(self, db, error=None):
+        self.db = db
+        self.error = error
+        self.calls = 0
+
+    def ensure_valid(self, touch=True):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        self.db.client.access_token = "refreshed"
+
+
+def test_expired_session_is_refreshed_to_deliver(outbox):
+    db = FakeDb(access_token=None)  # the tab was closed and its token lapsed
+    auth = FakeAuth(db)
+    outbox.register("u1", db, auth)
+    outbox.enqueue_case("u1", {"id": "a"})
+    outbox.flush()
+    assert db.cases.calls == [("insert", ["a"])]
+    assert auth.calls == 1
+
+
+def test_auth_outage_keeps_the_session_and_the_entries(outbox):
+    from auth_session import AuthUnavailableError
+
+    db = FakeDb()
+    outbox.register("u1", db, FakeAuth(db, AuthUnavailableError("down")))
+    outbox.enqueue_case("u1", {"id": "a"})
+    outbox.flush()
+    assert db.cases.calls == []
+    assert outbox.stats()["sessions"] == 1
+
+
+def test_rejected_or_lapsed_sessions_are_dropped(outbox):
+    from auth_session import AuthSessionError
+
+    rejected = FakeDb()
+    outbox.register("u1", rejected, FakeAuth(rejected, AuthSessionError("revoked")))
+    outbox.enqueue_case("u1", {"id": "a"})
+    outbox.register("u2", FakeDb(access_token=None))
+    outbox.register("u3", FakeDb())
+    outbox.flush()
+    assert rejected.cases.calls == []
+    assert outbox.stats()["sessions"] == 1  # u3 has a token and may still enqueue
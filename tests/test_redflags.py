@@ -0,0 +1,52 @@
+import pytest
+
+from redflags import RedFlagDetector
+
+
+@pytest.fixture(scope="module")
+def detector():
+    return RedFlagDetector.from_config(None)
+
+
+@pytest.mark.parametrize(
+    "text, flags",
+    [
+        ("She has a high fever and a stiff neck", ["Very high temperature", "Stiff neck"]),
+        ("no fever, no stiff neck", []),
+        ("No signs of a stiff neck", []),
+        ("He isn't floppy", []),
+        ("Denies difficulty breathing but lips turning blue", ["Blue lips or skin"]),
+        ("No rash and struggling to breathe", ["Difficulty breathing"]),
+        ("Purple rash that does not fade; seizure earlier", ["Non-blanching rash", "Seizure"]),
+        ("is not drinking", ["Signs of dehydration"]),
+        ("She can't stop vomiting blood", ["Blood in vomit or stool"]),
+        ("He won't stop convulsing", ["Seizure"]),
+        ("hasn't stopped gasping", ["Difficulty breathing"]),
+        ("Not sure if he hit his head", ["Head injury"]),
+        ("can't tell whether it's a purple rash", ["Non-blanching rash"]),
+        ("She doesn't have a stiff neck", []),
+        ("Fell and HIT  HIS\nHEAD on the slide", ["Head injury"]),
+        ("bluishness", []),
+        ("", []),
+    ],
+)
+def test_scan(detector, text, flags):
+    assert detector.scan(text) == flags
+
+
+def test_each_flag_is_reported_once(detector):
+    assert detector.scan("high fever, then a very high fever") == ["Very high temperature"]
+
+
+def test_overlapping_phrases_are_all_found():
+    d = RedFlagDetector({"A": ["he"], "B": ["she"], "C": ["hers"], "D": ["his"]})
+    text = "ushers he she hers his"
+    assert [(text[s:e], label) for s, e, label in d.matches(text)] == [
+        ("he", "A"), ("she", "B"), ("hers", "C"), ("his", "D"),
+    ]
+
+
+def test_custom_lexicon_from_json(tmp_path):
+    path = tmp_path / "lexicon.json"
+    path.write_text('{"Nosebleed": ["nosebleed", "nose bleed"]}', encoding="utf-8")
+    assert RedFlagDetector.from_config(str(path)).scan("A nose bleed at lunch") == ["Nosebleed"]
@@ -0,0 +1,180 @@
+import threading
+
+import httpx
+import pytest
+
+from cache import TTLCache
+from repos import Coalescer, Db, QueryStats
+
+
+class FakeQuery:
+    def __init__(self, data):
+        self.data = data
+        self.retry_enabled = True
+
+    def retry(self, enabled):
+        self.retry_enabled = enabled
+        return self
+
+    def execute(self):
+        return self
+
+
+class FakeBreakers:
+    def __init__(self):
+        self.names = []
+
+    def call(self, name, fn, seconds):
+        self.names.append(name)
+        return fn()
+
+
+class FakeClient:
+    def __init__(self, rows=None):
+        self.breakers = FakeBreakers()
+        self.rows = rows
+        self.tables = []
+        self.builders = []
+
+    def table(self, name):
+        self.tables.append(name)
+        self.builders.append(FakeBuilder(self.rows))
+        return self.builders[-1]
+
+
+class FakeBuilder:
+    """Swallows any chain of query-builder calls, then executes to ``rows``."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+
+        return method
+
+    @property
+    def data(self):
+        return self.rows
+
+    def execute(self):
+        return self
+
+
+def test_execute_turns_off_postgrest_retries():
+    db = Db(FakeClient(), QueryStats(), caches=None)
+    query = FakeQuery([{"id": "a"}])
+    assert db.execute("cases", "list", query).data == [{"id": "a"}]
+    assert query.retry_enabled is False
+
+
+def test_pending_count_runs_behind_its_own_breaker():
+    client = FakeClient(rows={"pending_ack": 3})
+    db = Db(client, QueryStats(), caches=None)
+    assert db.counters.pending_count("u1") == 3
+    assert client.tables == ["user_case_counters"]
+    assert client.breakers.names == ["user_case_counters"]
+
+
+def test_identical_reads_share_one_fetch():
+    loader = Coalescer()
+    fetches = []
+    for _ in range(3):
+        assert loader.read(("cases", "load", 1), lambda: fetches.append(1) or "row") == "row"
+    assert loader.read(("cases", "load", 2), lambda: fetches.append(2) or "other") == "other"
+    assert fetches == [1, 2]
+
+
+def test_concurrent_identical_reads_wait_for_the_first():
+    loader = Coalescer()
+    release = threading.Event()
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        release.wait(1)
+        return "row"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(loader.read("k", fetch))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    release.set()
+    for t in threads:
+        t.join(1)
+    assert results == ["row"] * 4 and fetches == [1]
+
+
+def test_failed_reads_are_not_memoised():
+    loader = Coalescer()
+
+    def fail():
+        raise httpx.ConnectError("down")
+
+    with pytest.raises(httpx.ConnectError):
+        loader.read("k", fail)
+    assert loader.read("k", lambda: "row") == "row"
+
+
+def test_fragment_runs_and_writes_drop_memoised_reads():
+    db = Db(FakeClient(), QueryStats(), caches=None)
+    db.loader.read("k", lambda: "old")
+    db.begin_fragment()
+    assert db.loader.read("k", lambda: "new") == "new"
+
+
+class FakeCaches:
+    def __init__(self):
+        self.recent_cases = TTLCache(60)
+        self.cases = TTLCache(60)
+        self.roster = TTLCache(60)
+
+
+def test_writes_do_not_touch_the_rerun_stale_marks():
+    db = Db(FakeClient(rows=[{"id": "c1", "child_id": "k1"}]), QueryStats(), FakeCaches())
+    db.mark_stale("cases")
+    db.loader.read(("cases", "load", "c1"), lambda: "old")
+    db.cases.attach_photo("c1", {"photo_url": "x"})
+    assert db.loader.read(("cases", "load", "c1"), lambda: "new") == "new"
+    assert db.take_stale("cases")
+    assert not db.take_stale("cases")  # shown once
+
+
+def case_rows(n):
+    return [{"id": f"c{i:02}", "created_at": f"2026-10-{28 - i:02}T09:00:00+00:00"} for i in range(n)]
+
+
+def test_page_fetches_one_extra_row_to_find_the_next_cursor():
+    client = FakeClient(rows=case_rows(4))
+    db = Db(client, QueryStats(), caches=None)
+    rows, cursor = db.cases.page_by_reporter("u1", limit=3)
+    assert [r["id"] for r in rows] == ["c00", "c01", "c02"]
+    assert cursor == ("2026-10-26T09:00:00+00:00", "c02")
+    calls = client.builders[0].calls
+    assert ("limit", (4,), {}) in calls
+    assert [c for c in calls if c[0] == "order"] == [
+        ("order", ("created_at",), {"desc": True}),
+        ("order", ("id",), {"desc": True}),
+    ]
+    assert not any(name == "or_" for name, _, _ in calls)  # first page: no seek
+
+
+def test_last_page_has_no_cursor():
+    db = Db(FakeClient(rows=case_rows(3)), QueryStats(), caches=None)
+    rows, cursor = db.cases.page_for_parent("p1", limit=3)
+    assert len(rows) == 3
+    assert cursor is None
+
+
+def test_later_pages_seek_past_the_cursor():
+    client = FakeClient(rows=[])
+    db = Db(client, QueryStats(), caches=None)
+    assert db.cases.page_by_reporter("u1", after=("2026-10-26T09:00:00+00:00", "c02"), limit=3) == ([], None)
+    seek = [args for name, args, _ in client.builders[0].calls if name == "or_"]
+    assert seek == [(
+        'created_at.lt."2026-10-26T09:00:00+00:00",'
+        'and(created_at.eq."2026-10-26T09:00:00+00:00",id.lt."c02")',
+    )]
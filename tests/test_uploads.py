@@ -0,0 +1,164 @@
+import io
+import threading
+from contextlib import contextmanager
+from datetime import date
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import uploads
+from images import peak_bytes, preprocess
+from uploads import LocalTusStore, MemoryBudget, PhotoUploader, UploadError, resumable_upload, upload_object
+
+
+def jpeg_bytes(size):
+    buf = io.BytesIO()
+    Image.new("RGB", size, (200, 120, 40)).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def png_bytes(size):
+    buf = io.BytesIO()
+    Image.new("RGB", size, (200, 120, 40)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+class FlakyStore:
+    def __init__(self, failures, retriable=True):
+        self.failures = failures
+        self.retriable = retriable
+        self.puts = 0
+
+    def put(self, path, data, content_type):
+        self.puts += 1
+        if self.puts <= self.failures:
+            raise UploadError("storage unavailable", retriable=self.retriable)
+
+    def public_url(self, path):
+        return f"https://storage/{path}"
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(uploads.time, "sleep", lambda seconds: None)
+
+
+def test_transient_put_failures_are_retried():
+    store = FlakyStore(failures=2)
+    assert upload_object(store, "a.jpg", b"data", "image/jpeg") == "https://storage/a.jpg"
+    assert store.puts == 3
+
+
+def test_put_gives_up_after_the_retry_limit():
+    store = FlakyStore(failures=uploads.UPLOAD_RETRIES + 1)
+    with pytest.raises(UploadError):
+        upload_object(store, "a.jpg", b"data", "image/jpeg")
+    assert store.puts == uploads.UPLOAD_RETRIES + 1
+
+
+def test_permanent_put_failure_is_not_retried():
+    store = FlakyStore(failures=1, retriable=False)
+    with pytest.raises(UploadError):
+        upload_object(store, "a.jpg", b"data", "image/jpeg")
+    assert store.puts == 1
+
+
+def test_reservation_larger_than_the_cap_is_refused():
+    budget = MemoryBudget(100)
+    with pytest.raises(UploadError) as excinfo:
+        with budget.reserve(101):
+            pass
+    assert not excinfo.value.retriable
+    assert budget.stats()["rejected"] == 1
+    assert budget.in_use == 0
+
+
+def test_reservations_wait_for_room_under_the_cap():
+    budget = MemoryBudget(100)
+    entered = threading.Event()
+
+    def second():
+        with budget.reserve(60):
+            entered.set()
+
+    with budget.reserve(60):
+        worker = threading.Thread(target=second)
+        worker.start()
+        assert not entered.wait(0.1)  # 60 + 60 would exceed the cap
+    worker.join(1)
+    assert entered.is_set()
+    assert budget.stats()["waits"] == 1
+
+
+def test_photo_too_big_for_the_budget_is_refused_before_decoding():
+    budget = MemoryBudget(1024 * 1024)
+    with pytest.raises(UploadError):
+        preprocess(jpeg_bytes((2000, 1500)), reserve=budget.reserve)
+    assert budget.peak == 0
+
+
+def test_preprocess_reserves_the_processing_peak():
+    seen = []
+
+    @contextmanager
+    def reserve(nbytes):
+        seen.append(nbytes)
+        yield
+
+    preprocess(png_bytes((1200, 900)), max_edge=600, reserve=reserve)
+    # Decoded source plus its transposed copy, at 4 bytes per RGB pixel
+    assert seen == [peak_bytes((1200, 900), "RGB", 600)] and seen[0] >= 2 * 1200 * 900 * 4
+
+
+class FlakyTusStore(LocalTusStore):
+    def __init__(self, root, drop_at):
+        super().__init__(root, "http://files")
+        self.drop_at = set(drop_at)
+        self.appends = 0
+
+    def append(self, upload_url, offset, chunk):
+        self.appends += 1
+        if self.appends in self.drop_at:
+            # The chunk lands but the response is lost
+            super().append(upload_url, offset, chunk)
+            raise UploadError("connection reset", retriable=True)
+        return super().append(upload_url, offset, chunk)
+
+
+def test_resumable_upload_resumes_from_the_server_offset(tmp_path):
+    store = FlakyTusStore(str(tmp_path), drop_at={2})
+    data = bytes(range(256)) * 40
+    resumable_upload(store, "cases/a.jpg", BytesIO(data), len(data), "image/jpeg", chunk_size=1000)
+    assert (tmp_path / "cases" / "a.jpg").read_bytes() == data
+    assert store.appends == 11  # no chunk sent twice
+
+
+def test_large_objects_go_through_tus(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "RESUMABLE_THRESHOLD", 10)
+    store = LocalTusStore(str(tmp_path), "http://files")
+    assert upload_object(store, "big.jpg", b"x" * 25, "image/jpeg") == "http://files/big.jpg"
+    assert (tmp_path / "big.jpg").read_bytes() == b"x" * 25
+
+
+class FakeDb:
+    client = None
+
+
+def test_failed_upload_is_forgotten_once_shown_for_a_while(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(uploads.time, "monotonic", lambda: clock[0])
+
+    def broken(*args, **kwargs):
+        raise UploadError("storage down")
+
+    monkeypatch.setattr(uploads, "store_case_photo", broken)
+    uploader = PhotoUploader(max_workers=1, attach=lambda *args: None)
+    uploader.submit(FakeDb(), "c1", "u1", date(2026, 10, 18), "a.jpg", BytesIO(b"x")).result()
+    uploader.submit(FakeDb(), "c2", "u1", date(2026, 10, 18), "b.jpg", BytesIO(b"x")).result()
+    assert uploader.status("c1") == "failed"
+    clock[0] += uploads.FAILED_SHOWN_FOR + 1
+    assert uploader.status("c1") is None
+    assert uploader.status("c2") == "failed"  # not shown until now
+    uploader.forget("c2")
+    assert uploader.status("c2") is None
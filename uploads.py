@@ -0,0 +1,379 @@
+"""Background, memory-bounded case-photo uploads.
+
+Submitting a case no longer waits on Storage: the case row is inserted
+first and the photo is handed to a process-wide worker pool, which
+preprocesses it, uploads the original and thumbnails, then patches the
+photo columns on the case.
+
+The uploader's buffer is spooled to disk in chunks rather than copied
+into one bytes object, decoding is bounded by a per-process memory
+budget (a photo whose processing peak exceeds it is refused), and large objects go up through resumable (TUS) uploads that
+continue from the server's offset after a dropped connection. Smaller
+objects (every photo at the default edge size) are single requests,
+retried with backoff on transient failures.
+"""
+import base64
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from io import BytesIO
+
+import httpx
+from storage3.exceptions import StorageApiError
+
+from breaker import STORAGE_BUDGET, CircuitOpenError
+from images import preprocess
+
+logger = logging.getLogger(__name__)
+
+PHOTO_BUCKET = "case-photos"
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+UPLOAD_MEMORY_CAP = int(os.getenv("UPLOAD_MEMORY_CAP_MB", "48")) * 1024 * 1024
+UPLOAD_BACKEND = os.getenv("UPLOAD_BACKEND", "supabase")  # supabase or local
+LOCAL_UPLOAD_DIR = os.getenv("LOCAL_UPLOAD_DIR", "static/uploads")
+LOCAL_UPLOAD_URL = os.getenv("LOCAL_UPLOAD_URL", "/app/static/uploads")
+
+SPOOL_CHUNK_SIZE = 1024 * 1024
+TUS_CHUNK_SIZE = 6 * 1024 * 1024  # Supabase requires 6MB chunks (last may be shorter)
+# Re-encoded photos at the default PHOTO_MAX_EDGE are well under 1MB, so
+# TUS only comes into play for larger configured edge sizes or formats;
+# smaller objects rely on put() being retried instead
+RESUMABLE_THRESHOLD = int(os.getenv("RESUMABLE_THRESHOLD_MB", "6")) * 1024 * 1024
+UPLOAD_RETRIES = 3
+FAILED_SHOWN_FOR = 600  # seconds a failed upload stays listed once it has been shown
+
+
+class UploadError(Exception):
+    def __init__(self, message, retriable=False):
+        super().__init__(message)
+        self.retriable = retriable
+
+
+class MemoryBudget:
+    """Caps the bytes held in memory by in-flight uploads in this process.
+
+    A reservation larger than the whole cap could never be honoured, so it
+    is refused with a non-retriable ``UploadError`` rather than let through.
+    """
+
+    def __init__(self, cap: int):
+        self.cap = cap
+        self.in_use = 0
+        self.peak = 0
+        self.waits = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def reserve(self, nbytes: int):
+        if nbytes > self.cap:
+            with self._cond:
+                self.rejected += 1
+            raise UploadError(
+                f"photo needs {nbytes / 2**20:.0f}MB to process, over the {self.cap / 2**20:.0f}MB limit"
+            )
+        with self._cond:
+            if self.in_use + nbytes > self.cap:
+                self.waits += 1
+            self._cond.wait_for(lambda: self.in_use + nbytes <= self.cap)
+            self.in_use += nbytes
+            self.peak = max(self.peak, self.in_use)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_use -= nbytes
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "cap": self.cap,
+                "in_use": self.in_use,
+                "peak": self.peak,
+                "waits": self.waits,
+                "rejected": self.rejected,
+            }
+
+
+def spool(fileobj, chunk_size=SPOOL_CHUNK_SIZE):
+    """Copy an uploaded file to a temp file one chunk at a time."""
+    out = tempfile.TemporaryFile()
+    fileobj.seek(0)
+    shutil.copyfileobj(fileobj, out, chunk_size)
+    out.seek(0)
+    return out
+
+
+class SupabaseTusStore:
+    """Supabase Storage: single-request uploads and the TUS resumable endpoint."""
+
+    def __init__(self, client, bucket=PHOTO_BUCKET):
+        self._client = client
+        self._bucket = bucket
+        self._breaker = f"storage:{bucket}"
+
+    def put(self, path, data, content_type):
+        try:
+            self._client.breakers.call(
+                self._breaker,
+                lambda: self._client.storage.from_(self._bucket).upload(path, data, {"content-type": content_type}),
+                STORAGE_BUDGET,
+            )
+        except (httpx.TransportError, CircuitOpenError) as e:
+            raise UploadError(str(e), retriable=True) from e
+        except StorageApiError as e:
+            raise UploadError(str(e), retriable=_status(e) >= 500 or _status(e) == 429) from e
+
+    def create(self, path, length, content_type):
+        metadata = {
+            "bucketName": self._bucket,
+            "objectName": path,
+            "contentType": content_type,
+            "cacheControl": "3600",
+        }
+        res = self._request("POST", f"{self._client.storage_url}upload/resumable", {
+            "Upload-Length": str(length),
+            "Upload-Metadata": ",".join(
+                f"{key} {base64.b64encode(value.encode()).decode()}" for key, value in metadata.items()
+            ),
+            "x-upsert": "true",
+        })
+        return res.headers["Location"]
+
+    def offset(self, upload_url):
+        return int(self._request("HEAD", upload_url, {}).headers["Upload-Offset"])
+
+    def append(self, upload_url, offset, chunk):
+        res = self._request("PATCH", upload_url, {
+            "Upload-Offset": str(offset),
+            "Content-Type": "application/offset+octet-stream",
+        }, content=chunk)
+        return int(res.headers["Upload-Offset"])
+
+    def complete(self, upload_url):
+        pass  # Storage finalises the object when the last chunk lands
+
+    def public_url(self, path):
+        return self._client.storage.from_(self._bucket).get_public_url(path)
+
+    def _request(self, method, url, headers, content=None):
+        headers = {**self._client.request_headers(), "Tus-Resumable": "1.0.0", **headers}
+
+        def send():
+            res = self._client.http.request(method, url, headers=headers, content=content)
+            if res.status_code >= 500:
+                res.raise_for_status()  # counted against the bucket's breaker
+            return res
+
+        try:
+            res = self._client.breakers.call(self._breaker, send, STORAGE_BUDGET)
+        except httpx.HTTPStatusError as e:
+            res = e.response
+        except (httpx.TransportError, CircuitOpenError) as e:
+            raise UploadError(str(e), retriable=True) from e
+        if res.status_code >= 400:
+            retriable = res.status_code >= 500 or res.status_code in (409, 423, 429)
+            raise UploadError(f"{method} {url} -> {res.status_code}: {res.text[:200]}", retriable)
+        return res
+
+
+class LocalTusStore:
+    """Filesystem stand-in with the same resumable protocol, for dev and tests."""
+
+    def __init__(self, root=LOCAL_UPLOAD_DIR, base_url=LOCAL_UPLOAD_URL):
+        self._root = root
+        self._base_url = base_url.rstrip("/")
+
+    def put(self, path, data, content_type):
+        with open(self._path(path), "wb") as f:
+            f.write(data)
+
+    def create(self, path, length, content_type):
+        with open(self._path(path) + ".part", "wb"):
+            pass
+        return path
+
+    def offset(self, upload_url):
+        return os.path.getsize(self._path(upload_url) + ".part")
+
+    def append(self, upload_url, offset, chunk):
+        part = self._path(upload_url) + ".part"
+        if os.path.getsize(part) != offset:
+            raise UploadError("offset mismatch", retriable=True)
+        with open(part, "ab") as f:
+            f.write(chunk)
+        return offset + len(chunk)
+
+    def complete(self, upload_url):
+        final = self._path(upload_url)
+        os.replace(final + ".part", final)
+
+    def public_url(self, path):
+        return f"{self._base_url}/{path}"
+
+    def _path(self, path):
+        full = os.path.join(self._root, path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        return full
+
+
+def _status(exc):
+    try:
+        return int(exc.status)
+    except (TypeError, ValueError):
+        return 0
+
+
+def make_store(client):
+    if UPLOAD_BACKEND == "local":
+        return LocalTusStore()
+    return SupabaseTusStore(client)
+
+
+def resumable_upload(store, path, fileobj, length, content_type, chunk_size=TUS_CHUNK_SIZE):
+    """Send ``fileobj`` in chunks, resuming from the server offset on failure."""
+    upload_url = store.create(path, length, content_type)
+    offset, attempts = 0, 0
+    while offset < length:
+        fileobj.seek(offset)
+        chunk = fileobj.read(min(chunk_size, length - offset))
+        try:
+            offset = store.append(upload_url, offset, chunk)
+            attempts = 0
+        except UploadError as e:
+            attempts += 1
+            if not e.retriable or attempts > UPLOAD_RETRIES:
+                raise
+            time.sleep(0.5 * 2 ** attempts)
+            offset = store.offset(upload_url)
+    store.complete(upload_url)
+
+
+def upload_object(store, path, data, content_type):
+    """Upload ``data``; objects above RESUMABLE_THRESHOLD use TUS."""
+    if len(data) > RESUMABLE_THRESHOLD:
+        resumable_upload(store, path, BytesIO(data), len(data), content_type)
+    else:
+        put_with_retry(store, path, data, content_type)
+    return store.public_url(path)
+
+
+def put_with_retry(store, path, data, content_type):
+    """Single-request upload, retried with backoff on transient failures."""
+    for attempt in range(UPLOAD_RETRIES + 1):
+        try:
+            return store.put(path, data, content_type)
+        except UploadError as e:
+            if not e.retriable or attempt == UPLOAD_RETRIES:
+                raise
+            time.sleep(0.5 * 2 ** (attempt + 1))
+
+
+def store_case_photo(client, user_id, entry_date, filename, source, budget=None):
+    """Upload the optimised photo plus its thumbnails; return the case fields."""
+    processed = preprocess(source, reserve=budget.reserve if budget else None)
+    stem = os.path.splitext(filename)[0]
+    base_path = f"cases/{user_id}/{entry_date.isoformat()}_{int(time.time())}_{stem}"
+    store = make_store(client)
+
+    # The encoded outputs stay in memory until sent; account for them too
+    with budget.reserve(processed.total_size) if budget else nullcontext():
+        fields = {
+            "photo_url": upload_object(
+                store, f"{base_path}.{processed.extension}", processed.data, processed.content_type
+            )
+        }
+        thumbs = {
+            size: upload_object(
+                store, f"{base_path}_{size}.{processed.extension}", payload, processed.content_type
+            )
+            for size, payload in processed.thumbnails.items()
+        }
+    fields["thumb_url"] = thumbs.get(128)
+    fields["thumb_url_2x"] = thumbs.get(256)
+    return fields, processed.bytes_saved
+
+
+class PhotoUploader:
+    """Thread pool that uploads photos and attaches them to existing cases."""
+
+    def __init__(self, max_workers=UPLOAD_WORKERS, memory_cap=UPLOAD_MEMORY_CAP, attach=None):
+        # attach(db, user_id, case_id, fields) records the uploaded photo on
+        # the case; by default the case is patched directly
+        self._attach = attach or (lambda db, user_id, case_id, fields: db.cases.attach_photo(case_id, fields))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="photo-upload")
+        self._lock = threading.Lock()
+        self._status = {}  # case_id -> "pending" | "failed"
+        self._failed_seen = {}  # case_id -> when its failure was first shown
+        self.budget = MemoryBudget(memory_cap)
+        self.completed = 0
+        self.failed = 0
+        self.bytes_saved = 0
+
+    def submit(self, db, case_id, user_id, entry_date, filename, fileobj):
+        """Queue ``fileobj`` (e.g. a Streamlit UploadedFile) for ``case_id``."""
+        spooled = spool(fileobj)
+        with self._lock:
+            self._status[case_id] = "pending"
+            self._failed_seen.pop(case_id, None)
+        return self._executor.submit(self._run, db, case_id, user_id, entry_date, filename, spooled)
+
+    def status(self, case_id):
+        """``"pending"``, ``"failed"`` or None.
+
+        A failure is reported for ``FAILED_SHOWN_FOR`` seconds after it is
+        first shown, then forgotten, so failed entries do not pile up.
+        """
+        with self._lock:
+            status = self._status.get(case_id)
+            if status != "failed":
+                return status
+            seen = self._failed_seen.setdefault(case_id, time.monotonic())
+            if time.monotonic() - seen > FAILED_SHOWN_FOR:
+                self._forget(case_id)
+                return None
+            return status
+
+    def forget(self, case_id):
+        """Drop ``case_id``'s failed status (e.g. its case was discarded)."""
+        with self._lock:
+            if self._status.get(case_id) == "failed":
+                self._forget(case_id)
+
+    def _forget(self, case_id):
+        del self._status[case_id]
+        self._failed_seen.pop(case_id, None)
+
+    def stats(self):
+        with self._lock:
+            pending = sum(1 for s in self._status.values() if s == "pending")
+            stats = {
+                "pending": pending,
+                "completed": self.completed,
+                "failed": self.failed,
+                "bytes_saved": self.bytes_saved,
+            }
+        stats["memory"] = self.budget.stats()
+        return stats
+
+    def _run(self, db, case_id, user_id, entry_date, filename, spooled):
+        try:
+            with spooled:
+                fields, saved = store_case_photo(db.client, user_id, entry_date, filename, spooled, self.budget)
+            self._attach(db, user_id, case_id, fields)
+        except Exception:
+            logger.exception("photo upload for case %s failed", case_id)
+            with self._lock:
+                self._status[case_id] = "failed"
+                self.failed += 1
+            return
+        with self._lock:
+            self._status.pop(case_id, None)
+            self.completed += 1
+            self.bytes_saved += saved